@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for extract_final.py against the implementations it replaced:
+the VALUES tokenizer on a synthetic WordPress dump, clean_text, the
+per-row memory of extracted posts, and end-to-end throughput of the three
+extractors on a generated dump.
+"""
+
+import argparse
+import contextlib
+import html
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import extract_final
+import extract_wp_advanced
+import extract_wp_content
+
+DIVI_SNIPPETS = [
+    '[et_pb_section fb_built=\\"1\\" _builder_version=\\"4.16\\" background_image=\\"https://example.com/wp-content/uploads/2022/05/hero.jpg\\"]',
+    '[et_pb_row][et_pb_column type=\\"4_4\\"]',
+    '[et_pb_text _builder_version=\\"4.16\\"]<h2>Mohs Surgery (Skin Cancer)</h2>\\r\\n<p>Dr. Smith\\\'s team treats basal &amp; squamous cell carcinoma.</p>[/et_pb_text]',
+    '[et_pb_image src=\\"https://example.com/wp-content/uploads/2022/05/office.png\\" alt=\\"Office, Trussville\\"][/et_pb_image]',
+    '[dsm_icon_list_item]Botox (20% off), fillers & peels[/dsm_icon_list_item]',
+    '<p>Call (205) 555-0123 \\"today\\" \u2013 we\\\'re open Mon\\tFri.</p>\\n',
+    '[/et_pb_column][/et_pb_row][/et_pb_section]',
+]
+
+def synthetic_post(post_id, rng, content_kb=8):
+    """Build one wp_posts tuple in mysqldump syntax"""
+    target = content_kb * 1024
+    parts = []
+    size = 0
+    while size < target:
+        snippet = rng.choice(DIVI_SNIPPETS)
+        parts.append(snippet)
+        size += len(snippet)
+    content = ''.join(parts)
+    post_type = rng.choice(['page', 'page', 'revision', 'revision', 'attachment', 'nav_menu_item'])
+    fields = [
+        str(post_id), '2',
+        "'2025-05-06 16:15:11'", "'2025-05-06 21:15:11'",
+        "'" + content + "'",
+        "'Synthetic Post %d (Draft)'" % post_id,
+        "''", "'publish'", "'closed'", "'closed'", "''",
+        "'synthetic-post-%d'" % post_id,
+        "''", "''",
+        "'2025-05-06 16:15:11'", "'2025-05-06 21:15:11'",
+        "''", '0',
+        "'https://example.com/?p=%d'" % post_id,
+        '0', "'%s'" % post_type, "''", '0',
+    ]
+    return '(' + ','.join(fields) + ')'
+
+def generate_dump(path, size_mb, statement_mb, seed=0):
+    """Write a synthetic dump of roughly size_mb made of extended INSERTs"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    statement_target = statement_mb * 1024 * 1024
+    written = 0
+    post_id = 1
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('-- Synthetic WordPress dump\n')
+        f.write('DROP TABLE IF EXISTS `wp_posts`;\n')
+        while written < target:
+            rows = []
+            statement_size = 0
+            while statement_size < statement_target and written + statement_size < target:
+                row = synthetic_post(post_id, rng)
+                rows.append(row)
+                statement_size += len(row) + 1
+                post_id += 1
+            line = 'INSERT INTO `wp_posts` VALUES ' + ','.join(rows) + ';\n'
+            f.write(line)
+            written += len(line)
+    return post_id - 1
+
+# (meta_key, SQL literal) cycled through for each post's wp_postmeta rows
+META_ROWS = [
+    ('_edit_lock', "'1746548111:2'"),
+    ('_edit_last', "'2'"),
+    ('_wp_page_template', "'default'"),
+    ('_et_pb_use_builder', "'on'"),
+    ('_et_pb_page_layout', "'et_full_width_page'"),
+    ('_thumbnail_id', "'0'"),
+    ('_wp_attachment_metadata',
+     "'a:3:{s:5:\\\"width\\\";i:1024;s:6:\\\"height\\\";i:683;"
+     "s:4:\\\"file\\\";s:16:\\\"2022/05/hero.jpg\\\";}'"),
+    ('_et_pb_custom_css', "'.et_pb_text h2 { color: #1a3c6e; } /* \\'quoted\\' (1) */'"),
+    ('_wds_trimmed_excerpt', "'Mohs Surgery (Skin Cancer) – Dr. Smith\\'s team\\r\\n'"),
+    ('_et_builder_module_features_cache',
+     "'[\\\"{\\\\\\\"gph\\\\\\\":0,\\\\\\\"divi\\\\\\\":\\\\\\\"4.16\\\\\\\"}\\\",{\\\"et_pb_section_0\\\":{\\\"bared\\\":true}}]'"),
+]
+
+def create_table(table):
+    """A CREATE TABLE statement for table with the stock WordPress columns"""
+    columns = extract_final.TABLE_COLUMNS[table]
+    lines = [f'  `{column}` longtext NOT NULL' for column in columns]
+    lines.append(f'  PRIMARY KEY (`{columns[0]}`)')
+    return f'CREATE TABLE `{table}` (\n' + ',\n'.join(lines) + '\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;\n'
+
+def write_inserts(f, table, rows, statement_rows, multiline):
+    """
+    Write rows as extended INSERTs of up to statement_rows rows; multiline
+    puts a column list and each row on lines of their own, as phpMyAdmin
+    exports do. Returns the bytes written.
+    """
+    written = 0
+    if multiline:
+        columns = ', '.join(f'`{column}`' for column in extract_final.TABLE_COLUMNS[table])
+        head, sep = f'INSERT INTO `{table}` ({columns}) VALUES\n', ',\n'
+    else:
+        head, sep = f'INSERT INTO `{table}` VALUES ', ','
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == statement_rows:
+            written += f.write(head + sep.join(batch) + ';\n')
+            batch = []
+    if batch:
+        written += f.write(head + sep.join(batch) + ';\n')
+    return written
+
+def generate_wordpress_dump(path, posts, meta_per_post, content_kb=8, multiline=False,
+                            statement_rows=500, seed=0):
+    """
+    Write a dump of posts wp_posts rows of Divi-heavy content, each with
+    meta_per_post wp_postmeta rows, after their CREATE TABLE statements.
+    Returns (posts, meta rows, bytes).
+    """
+    rng = random.Random(seed)
+
+    def post_rows():
+        for post_id in range(1, posts + 1):
+            yield synthetic_post(post_id, rng, content_kb)
+
+    def meta_rows():
+        meta_id = 1
+        for post_id in range(1, posts + 1):
+            for i in range(meta_per_post):
+                key, value = META_ROWS[i % len(META_ROWS)]
+                if i >= len(META_ROWS):
+                    key = f'{key}_{i // len(META_ROWS)}'
+                yield f"({meta_id},{post_id},'{key}',{value})"
+                meta_id += 1
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('-- Synthetic WordPress dump\n')
+        for table in ('wp_posts', 'wp_postmeta'):
+            f.write(f'DROP TABLE IF EXISTS `{table}`;\n' + create_table(table))
+        write_inserts(f, 'wp_posts', post_rows(), statement_rows, multiline)
+        write_inserts(f, 'wp_postmeta', meta_rows(), statement_rows, multiline)
+    return posts, posts * meta_per_post, os.path.getsize(path)
+
+def legacy_parse(line):
+    """Old parse_values_from_insert entry point built on the legacy scanner"""
+    match = re.search(r'VALUES\s+(.+);?\s*$', line, re.DOTALL)
+    if not match:
+        return []
+    return extract_final._parse_values_legacy(match.group(1).rstrip(';'))
+
+def bench_parsers(sql_file, parsers):
+    """
+    Run every parser over each INSERT line of sql_file.
+
+    Returns {name: (seconds, records, bytes)} and exits if the parsers
+    disagree on any line.
+    """
+    results = {name: [0.0, 0, 0] for name in parsers}
+    with open(sql_file, 'r', encoding='utf-8', errors='ignore') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line.startswith('INSERT INTO'):
+                continue
+            expected = None
+            for name, parse in parsers.items():
+                start = time.perf_counter()
+                records = parse(line)
+                results[name][0] += time.perf_counter() - start
+                results[name][1] += len(records)
+                results[name][2] += len(line)
+                if expected is None:
+                    expected = records
+                elif records != expected:
+                    raise SystemExit(f"{name} disagrees at line {line_num}")
+    return results
+
+def legacy_clean_text(text):
+    """clean_text as it was before the single-pass unescape"""
+    if not text or text in ('NULL', 'null'):
+        return ""
+    if (text.startswith("'") and text.endswith("'")) or (text.startswith('"') and text.endswith('"')):
+        text = text[1:-1]
+    text = text.replace("\\'", "'").replace('\\"', '"').replace("\\\\", "\\")
+    text = text.replace("\\r\\n", "\n").replace("\\n", "\n").replace("\\r", "\n")
+    text = text.replace("\\t", "\t")
+    text = html.unescape(text)
+    return text
+
+def bench_clean_text(content_kb, number):
+    """Time clean_text against legacy_clean_text on one Divi-heavy field"""
+    rng = random.Random(0)
+    fields = {
+        'post_content': "'" + ''.join(rng.choice(DIVI_SNIPPETS) for _ in range(content_kb * 8)) + "'",
+        'post_title': "'Mohs Surgery'",
+        'post_date': "'2025-05-06 16:15:11'",
+    }
+    for field, raw in fields.items():
+        for name, clean in (('clean_text', extract_final.clean_text), ('legacy', legacy_clean_text)):
+            start = time.perf_counter()
+            for _ in range(number):
+                clean(raw)
+            per_call = (time.perf_counter() - start) / number
+            print(f"{field:>12} {name:>10}: {per_call * 1e6:10.1f} us/call  ({len(raw)} chars)")
+
+def legacy_post_dict(data, bounds):
+    """A post as the eager 24-key dict extract_final used to build"""
+    post = {}
+    for i, name in enumerate(extract_final.POST_COLUMNS):
+        post[name] = extract_final.decode_field(data[bounds[i]:bounds[i + 1] - 1])
+    post['meta'] = {}
+    return post
+
+def measure_rows(build):
+    """Return (rows, bytes still allocated) for the list build() returns"""
+    tracemalloc.start()
+    rows = build()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(rows), allocated
+
+def bench_memory(sql_file):
+    """Per-row footprint of legacy dicts and Post at each decoding stage"""
+    with open(sql_file, 'rb') as f:
+        data = f.read()
+
+    def tuples():
+        return extract_final.iter_buffer_tuples(data, ('wp_posts',))
+
+    def lazy_posts():
+        return extract_final.collect_posts(tuples())[0]
+
+    def classified_posts():
+        posts = lazy_posts()
+        for post in posts:
+            post['post_type'], post['post_status']
+        return posts
+
+    def decoded_posts():
+        posts = lazy_posts()
+        for post in posts:
+            for key in post:
+                post[key]
+        return posts
+
+    stages = [
+        ('legacy dict', lambda: [legacy_post_dict(d, b) for _, d, b in tuples()]),
+        ('Post lazy', lazy_posts),
+        ('Post type+status', classified_posts),
+        ('Post decoded', decoded_posts),
+    ]
+    for name, build in stages:
+        rows, allocated = measure_rows(build)
+        print(f"{name:>16}: {allocated / rows:10.0f} bytes/row  ({rows} rows, "
+              f"{allocated / (1024 * 1024):.1f} MB)")
+
+def _lap(phases, name, start):
+    now = time.perf_counter()
+    phases[name] = now - start
+    return now
+
+def run_pipeline(parse, rules):
+    """
+    Time parse(), which returns (posts, taxonomy or None), then the same
+    work for every extractor: decode every field of every post, classify
+    the posts with rules and render their content. Returns (posts, meta
+    rows, {phase: seconds}).
+    """
+    phases = {}
+    start = time.perf_counter()
+    posts, taxonomy = parse()
+    start = _lap(phases, 'parse', start)
+    for post in posts:
+        post.to_dict()
+    start = _lap(phases, 'decode', start)
+    extract_final.classify_posts(posts, rules, taxonomy)
+    start = _lap(phases, 'classify', start)
+    for post in posts:
+        extract_final.render_content(post['post_content'])
+    _lap(phases, 'render', start)
+    return len(posts), sum(len(post['meta']) for post in posts), phases
+
+def run_final(sql_file):
+    return run_pipeline(lambda: (extract_final.process_sql_file(sql_file), None),
+                        extract_final.load_category_rules())
+
+def run_advanced(sql_file):
+    return run_pipeline(lambda: (extract_wp_advanced.process_sql_file(sql_file), None),
+                        extract_wp_advanced.RULES)
+
+def run_content(sql_file):
+    # extract_wp_content's counterpart of process_sql_file
+    return run_pipeline(lambda: extract_wp_content.extract_content(sql_file),
+                        extract_wp_content.RULES)
+
+EXTRACTORS = {
+    'extract_final': run_final,
+    'extract_wp_advanced': run_advanced,
+    'extract_wp_content': run_content,
+}
+
+def measure_extractor(name, sql_file):
+    """Run one extractor quietly in this (fresh) process and time it"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        posts, meta, phases = EXTRACTORS[name](sql_file)
+        elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'posts': posts, 'meta_rows': meta, 'peak_rss': extract_final.peak_rss(), 'phases': phases}
+
+def bench_extractors(sql_file, names, repeat=1, warm_index=False):
+    """
+    Time each extractor in names on sql_file, each run in a spawned process
+    so peak RSS is its own, keeping the fastest of repeat runs. Unless
+    warm_index, extract_final's statement index cache is deleted first.
+    """
+    size = os.path.getsize(sql_file)
+    index_file = sql_file + '.index.json'
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in names:
+        best = None
+        for _ in range(repeat):
+            if not warm_index and os.path.exists(index_file):
+                os.remove(index_file)
+            with context.Pool(1) as pool:
+                run = pool.apply(measure_extractor, (name, sql_file))
+            if best is None or run['seconds'] < best['seconds']:
+                best = run
+        rows = best['posts'] + best['meta_rows']
+        results.append({
+            'extractor': name,
+            **best,
+            'mb_per_s': size / (1024 * 1024) / best['seconds'],
+            'rows_per_s': rows / best['seconds'],
+        })
+    return results
+
+def report(name, elapsed, records, nbytes):
+    mb = nbytes / (1024 * 1024)
+    print(f"{name:>10}: {elapsed:8.2f}s  {mb / elapsed if elapsed else 0:8.1f} MB/s  "
+          f"{records / elapsed if elapsed else 0:10.0f} rows/s  ({records} rows)")
+
+def run_tokenizer(args):
+    sql_file = args.dump
+    tmp_dir = None
+    if not sql_file:
+        tmp_dir = tempfile.mkdtemp(prefix='bench-extract-')
+        sql_file = os.path.join(tmp_dir, 'synthetic.sql')
+        print(f"Generating {args.size_mb} MB synthetic dump at {sql_file}...")
+        rows = generate_dump(sql_file, args.size_mb, args.statement_mb)
+        print(f"  {rows} rows")
+
+    try:
+        parsers = {'tokenizer': extract_final.parse_values_from_insert}
+        if not args.skip_legacy:
+            parsers['legacy'] = legacy_parse
+        for name, result in bench_parsers(sql_file, parsers).items():
+            report(name, *result)
+    finally:
+        if tmp_dir:
+            os.remove(sql_file)
+            os.rmdir(tmp_dir)
+
+def run_clean_text(args):
+    bench_clean_text(args.content_kb, args.number)
+
+def run_memory(args):
+    tmp_dir = tempfile.mkdtemp(prefix='bench-extract-')
+    sql_file = os.path.join(tmp_dir, 'synthetic.sql')
+    try:
+        generate_dump(sql_file, args.size_mb, 1)
+        bench_memory(sql_file)
+    finally:
+        os.remove(sql_file)
+        os.rmdir(tmp_dir)
+
+def run_extractors(args):
+    sql_file = args.dump
+    tmp_dir = None
+    dump = {}
+    if not sql_file:
+        tmp_dir = tempfile.mkdtemp(prefix='bench-extract-')
+        sql_file = os.path.join(tmp_dir, 'synthetic.sql')
+        print(f"Generating {args.posts} posts with {args.meta_per_post} meta rows each at {sql_file}...",
+              file=sys.stderr)
+        posts, meta, size = generate_wordpress_dump(sql_file, args.posts, args.meta_per_post, args.content_kb,
+                                                    args.multiline, args.statement_rows)
+        dump = {'posts': posts, 'meta_rows': meta, 'content_kb': args.content_kb,
+                'multiline': args.multiline, 'statement_rows': args.statement_rows}
+
+    try:
+        dump = {'path': args.dump, **dump, 'bytes': os.path.getsize(sql_file)}
+        results = bench_extractors(sql_file, args.only or list(EXTRACTORS), args.repeat, args.warm_index)
+    finally:
+        if tmp_dir:
+            for name in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, name))
+            os.rmdir(tmp_dir)
+
+    report_json = {'python': sys.version.split()[0], 'dump': dump, 'results': results}
+    text = json.dumps(report_json, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for result in results:
+        print(f"{result['extractor']:>20}: {result['seconds']:8.2f}s  {result['mb_per_s']:8.1f} MB/s  "
+              f"{result['rows_per_s']:10.0f} rows/s", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    tokenizer = commands.add_parser('tokenizer', help='VALUES tokenizer vs the legacy parser')
+    tokenizer.add_argument('--dump', help='Existing dump to benchmark instead of generating one')
+    tokenizer.add_argument('--size-mb', type=int, default=500, help='Synthetic dump size (default: 500)')
+    tokenizer.add_argument('--statement-mb', type=int, default=100,
+                           help='Approximate size of each extended INSERT (default: 100)')
+    tokenizer.add_argument('--skip-legacy', action='store_true', help='Only time the new tokenizer')
+    tokenizer.set_defaults(run=run_tokenizer)
+
+    clean = commands.add_parser('clean-text', help='clean_text micro-benchmark')
+    clean.add_argument('--content-kb', type=int, default=64, help='post_content size (default: 64)')
+    clean.add_argument('--number', type=int, default=200, help='Calls per measurement (default: 200)')
+    clean.set_defaults(run=run_clean_text)
+
+    memory = commands.add_parser('memory', help='Per-row memory of extracted posts')
+    memory.add_argument('--size-mb', type=int, default=50, help='Synthetic dump size (default: 50)')
+    memory.set_defaults(run=run_memory)
+
+    extractors = commands.add_parser('extractors', help='Throughput of the three extractors, as JSON')
+    extractors.add_argument('--dump', help='Existing dump to benchmark instead of generating one')
+    extractors.add_argument('--posts', type=int, default=2000, help='Synthetic posts (default: 2000)')
+    extractors.add_argument('--meta-per-post', type=int, default=20,
+                            help='wp_postmeta rows per post (default: 20)')
+    extractors.add_argument('--content-kb', type=int, default=8, help='post_content size (default: 8)')
+    extractors.add_argument('--statement-rows', type=int, default=500,
+                            help='Rows per extended INSERT (default: 500)')
+    extractors.add_argument('--multiline', action='store_true',
+                            help='phpMyAdmin-style INSERTs: a column list and one row per line')
+    extractors.add_argument('--only', action='append', choices=list(EXTRACTORS),
+                            help='Benchmark just this extractor (repeatable)')
+    extractors.add_argument('--repeat', type=int, default=1, help='Keep the fastest of N runs (default: 1)')
+    extractors.add_argument('--warm-index', action='store_true',
+                            help="Keep extract_final's cached statement index between runs")
+    extractors.add_argument('--output', help='Write the JSON report here instead of stdout')
+    extractors.set_defaults(run=run_extractors)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
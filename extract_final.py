@@ -1,41 +1,157 @@
 #!/usr/bin/env python3
 """
 Final WordPress SQL content extractor - optimized for single-line INSERTs
+
+Also the library extract_wp_content.py and extract_wp_advanced.py are thin
+presets over. Extraction is a chain of generator stages, each taking the
+previous one's items:
+
+    reader      read_mapped -> (data, start, end)
+    splitter    split_statements -> (kind, table, data, start, end)
+    tokenizer   tokenize_statements -> (table, data, bounds)
+    decoder     decode_rows -> (table, value)
+    joiner      join_posts -> posts with meta, categories and tags
+    classifier  label_posts -> (post, output names)
+    sink        json_sink
+
+iter_dump_tuples composes the first three for plain dumps; compressed ones
+go through read_stream, which does all three over the decompressed stream.
 """
 
 import re
 import json
 import html
-from collections import defaultdict
+import mmap
+import argparse
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 import os
+import sys
+import hashlib
+import math
+import time
+import sqlite3
+import gzip
+import lzma
+import bz2
+from array import array
+from bisect import bisect_right
+from contextlib import closing, contextmanager, nullcontext
+from fnmatch import fnmatchcase
+from urllib.parse import unquote
 
-def clean_text(text):
-    """Clean and decode HTML entities"""
+class _EscapeTable(dict):
+    """Unknown escapes just drop the backslash, as MySQL does"""
+    def __missing__(self, key):
+        return key
+
+# Characters after a backslash in MySQL string literals. \% and \_ keep the
+# backslash outside LIKE patterns; CR and CRLF become LF as they always have.
+_SQL_ESCAPES = _EscapeTable({
+    '0': '\0', "'": "'", '"': '"', 'b': '\b', 'n': '\n', 'r': '\n',
+    'r\\n': '\n', 't': '\t', 'Z': '\x1a', '\\': '\\', '%': '\\%', '_': '\\_',
+})
+_SQL_ESCAPE_RE = re.compile(r'\\(r\\n|.)', re.DOTALL)
+
+def sql_unescape(text):
+    """A SQL field's text without its quotes and escapes, NULL as ''"""
     if not text or text in ('NULL', 'null'):
         return ""
     # Remove surrounding quotes
     if (text.startswith("'") and text.endswith("'")) or (text.startswith('"') and text.endswith('"')):
         text = text[1:-1]
-    # Unescape SQL escapes
-    text = text.replace("\\'", "'").replace('\\"', '"').replace("\\\\", "\\")
-    text = text.replace("\\r\\n", "\n").replace("\\n", "\n").replace("\\r", "\n")
-    text = text.replace("\\t", "\t")
+    # Unescape SQL escapes in a single scan: split around every escape and
+    # map the escaped characters through the lookup table
+    if '\\' in text:
+        parts = _SQL_ESCAPE_RE.split(text)
+        parts[1::2] = map(_SQL_ESCAPES.__getitem__, parts[1::2])
+        text = ''.join(parts)
+    return text
+
+def clean_text(text):
+    """Clean and decode HTML entities"""
+    text = sql_unescape(text)
     # Decode HTML entities
-    text = html.unescape(text)
+    if '&' in text:
+        text = html.unescape(text)
     return text
 
+# One field of a VALUES tuple: any mix of quoted strings (with backslash
+# escapes) and unquoted runs, followed by the delimiter that ended it.
+# group(1) is a field separator, group(2) closes the record.
+_FIELD_PATTERN = r"""
+    (?:
+        '[^'\\]*(?:\\.[^'\\]*)*'
+      | "[^"\\]*(?:\\.[^"\\]*)*"
+      | [^,()'"]+
+    )*
+    (?:(,)|(\)))?
+"""
+_FIELD_RE = re.compile(_FIELD_PATTERN, re.DOTALL | re.VERBOSE)
+_FIELD_RE_BYTES = re.compile(_FIELD_PATTERN.encode(), re.DOTALL | re.VERBOSE)
+
+_VALUES_RE = re.compile(r'VALUES\s+(?=.)', re.DOTALL)
+
 def parse_values_from_insert(line):
     """
     Parse VALUES from INSERT statement.
     This handles the format: INSERT INTO `table` VALUES (row1),(row2),...;
     """
-    # Extract everything between VALUES and the final semicolon
-    match = re.search(r'VALUES\s+(.+);?\s*$', line, re.DOTALL)
+    match = _VALUES_RE.search(line)
     if not match:
         return []
 
-    values_str = match.group(1).rstrip(';')
+    start = match.end()
+    end = len(line)
+    while end > start and line[end - 1] == ';':
+        end -= 1
+
+    records = _tokenize_values(line, start, end)
+    if records is None:
+        # Irregular input (nested parens, unterminated quotes, junk between
+        # records) - let the character scanner decide what it means
+        records = _parse_values_legacy(line[start:end])
+    return records
+
+def _tokenize_values(values_str, pos, end):
+    """
+    Split values_str[pos:end] into records of raw field slices.
+
+    Jumps from delimiter to delimiter with _FIELD_RE instead of walking the
+    string a character at a time. Returns None when the input is not a plain
+    (..),(..) list so the caller can fall back to _parse_values_legacy.
+    """
+    records = []
+    match_field = _FIELD_RE.match
+
+    while pos < end:
+        if values_str[pos] != '(':
+            if values_str[pos:end].strip():
+                return None
+            break
+        pos += 1
+
+        record = []
+        while True:
+            m = match_field(values_str, pos, end)
+            delimiter = m.lastindex
+            if delimiter is None:
+                return None
+            field_end = m.end()
+            record.append(values_str[pos:field_end - 1])
+            pos = field_end
+            if delimiter == 2:
+                break
+
+        records.append(record)
+        if pos < end and values_str[pos] == ',':
+            pos += 1
 
+    return records
+
+def _parse_values_legacy(values_str):
+    """Character-by-character VALUES parser, kept as the reference implementation"""
     # Now we need to split by "),(" but respecting quotes
     # We'll track parenthesis depth and quotes
     records = []
@@ -125,177 +241,3026 @@ def parse_values_from_insert(line):
 
     return records
 
-def process_sql_file(sql_file):
-    """Process the SQL file line by line"""
-    print("Reading and processing SQL file...")
+CHUNK_SIZE = 1024 * 1024
+
+# Statement header, only at the start of a line: either an INSERT, group(1)
+# being the table and group(2) its column list if given, or a CREATE TABLE,
+# group(3) being the table
+_INSERT_RE = re.compile(
+    rb'^(?:INSERT INTO `([^`]+)`\s*(?:\(([^)]*)\)\s*)?VALUES\s*|CREATE TABLE `([^`]+)`)',
+    re.MULTILINE)
+# The ';' closing a CREATE TABLE, which mysqldump puts at the end of a line
+_CREATE_END_RE = re.compile(rb';\r?\n')
+# Column definitions inside a CREATE TABLE, one per line; keys don't start with '`'
+_COLUMN_DEF_RE = re.compile(rb'^\s+`([^`]+)`', re.MULTILINE)
+# Whitespace and the comma between two tuples
+_GAP_RE = re.compile(rb'[\s,]*')
+# Longest partial line kept around while looking for the next INSERT header
+_MAX_HEADER = 64 * 1024
+
+def parse_create_columns(statement):
+    """Column names, in order, of a CREATE TABLE statement as bytes"""
+    return tuple(name.decode('utf-8', 'ignore') for name in _COLUMN_DEF_RE.findall(statement))
+
+def parse_column_list(column_list):
+    """Column names of an INSERT column list such as b'`ID`, `post_title`'"""
+    return tuple(name.strip().strip(b'`').decode('utf-8', 'ignore')
+                 for name in column_list.split(b','))
+
+def _scan_tuples(stream, buf, tables, chunk_size, copy, start=0, end=None, columns=None):
+    """
+    Core INSERT scanner behind the iter_insert_* functions.
+
+    Yields (table, buf, bounds) for each VALUES tuple, where field i is
+    buf[bounds[i]:bounds[i + 1] - 1]. With a stream, buf is a sliding window
+    refilled chunk_size bytes at a time; with copy set each tuple's bytes are
+    copied out of it so the result outlives the window. With stream=None, buf
+    is the whole dump, only buf[start:end] is scanned and bounds are absolute
+    offsets into it.
+
+    If columns is a dict, the column order of each table is recorded in it
+    as CREATE TABLE statements and INSERT column lists go by, before any of
+    the tuples they describe are yielded.
+    """
+    match_insert = _INSERT_RE.search
+    match_gap = _GAP_RE.match
+    match_field = _FIELD_RE_BYTES.match
+
+    pos = start
+    limit = len(buf) if end is None else end
+    eof = stream is None
+    table = None
+    wanted = False
+
+    while True:
+        need_more = False
+
+        if table is None:
+            m = match_insert(buf, pos, limit)
+            if m is None:
+                # Only the tail can still turn into a header once more arrives
+                pos = max(pos, limit - _MAX_HEADER)
+                need_more = True
+            elif m.group(3) is not None:
+                pos = m.end()
+                if columns is not None:
+                    close_at = _CREATE_END_RE.search(buf, pos, limit)
+                    if close_at:
+                        names = parse_create_columns(buf[pos:close_at.start()])
+                        if names:
+                            columns[m.group(3).decode('utf-8', 'ignore')] = names
+                        pos = close_at.end()
+                    elif not eof and limit - m.start() < _MAX_HEADER:
+                        # Read the rest of the definition and match it again
+                        pos = m.start()
+                        need_more = True
+            else:
+                table = m.group(1).decode('utf-8', 'ignore')
+                wanted = tables is None or table in tables
+                if wanted and columns is not None and m.group(2) is not None:
+                    columns[table] = parse_column_list(m.group(2))
+                pos = m.end()
+        else:
+            start = match_gap(buf, pos, limit).end()
+            opener = buf[start:start + 1] if start < limit else b''
+            if not opener:
+                need_more = True
+            elif opener == b'(':
+                bounds = array('q', (start + 1,))
+                p = start + 1
+                while True:
+                    m = match_field(buf, p, limit)
+                    delimiter = m.lastindex
+                    if delimiter is None:
+                        break
+                    p = m.end()
+                    if wanted:
+                        bounds.append(p)
+                    if delimiter == 2:
+                        break
+                if delimiter is None:
+                    if eof:
+                        raise ValueError(f"Malformed VALUES tuple in `{table}`")
+                    # Tuple continues past the buffer; retry it with more data
+                    pos = start
+                    need_more = True
+                else:
+                    pos = p
+                    if wanted:
+                        if copy:
+                            base = bounds[0]
+                            yield table, buf[base:p], array('q', [b - base for b in bounds])
+                        else:
+                            yield table, buf, bounds
+            else:
+                # ';' or a trailing clause such as ON DUPLICATE KEY ends it
+                table = None
+                pos = start + 1 if opener == b';' else start
+
+        if need_more:
+            if eof:
+                return
+            # Keep one byte before pos so a '^' match there still means the
+            # start of a line, and read at least as much as is pending so a
+            # huge tuple is rescanned only a logarithmic number of times
+            keep = max(pos - 1, 0)
+            chunk = stream.read(max(chunk_size, len(buf) - pos))
+            buf = buf[keep:] + chunk
+            limit = len(buf)
+            pos -= keep
+            eof = not chunk
+
+def iter_insert_tuples(stream, tables=None, chunk_size=CHUNK_SIZE, columns=None):
+    """
+    Yield (table, data, bounds) for every VALUES tuple of every INSERT
+    statement in a binary stream, reading it chunk_size bytes at a time.
+
+    data holds just that tuple's bytes and field i is
+    data[bounds[i]:bounds[i + 1] - 1], quotes and escapes included.
+    Statements may span lines and hold any number of tuples, so extended and
+    --skip-extended-insert dumps both work. Only the tuple being parsed is
+    kept in memory, which keeps peak usage flat however big the dump is.
+    Pass tables to skip every other table, and a dict as columns to have the
+    column order of each table recorded in it (see _scan_tuples).
+    """
+    return _scan_tuples(stream, b'', tables, chunk_size, True, columns=columns)
+
+def iter_buffer_tuples(data, tables=None, start=0, end=None, columns=None):
+    """
+    Like iter_insert_tuples, but over a dump already in memory or mapped
+    (bytes or mmap). Yields data itself with absolute offsets, copying nothing.
+    start and end limit the scan to one byte range, which must begin at a
+    statement boundary.
+    """
+    return _scan_tuples(None, data, tables, CHUNK_SIZE, False, start, end, columns)
+
+def decode_field(raw):
+    """Decode one raw field of a tuple: SQL escapes, then HTML entities"""
+    return clean_text(raw.decode('utf-8', 'ignore'))
+
+def decode_sql_field(raw):
+    """decode_field without the HTML decoding, for values decode_meta_value takes"""
+    return sql_unescape(raw.decode('utf-8', 'ignore'))
+
+def decode_interned(raw):
+    """decode_field for low-cardinality columns, sharing equal values"""
+    return sys.intern(decode_field(raw))
+
+# Field order based on CREATE TABLE
+POST_COLUMNS = (
+    'ID', 'post_author', 'post_date', 'post_date_gmt', 'post_content',
+    'post_title', 'post_excerpt', 'post_status', 'comment_status',
+    'ping_status', 'post_password', 'post_name', 'to_ping', 'pinged',
+    'post_modified', 'post_modified_gmt', 'post_content_filtered',
+    'post_parent', 'guid', 'menu_order', 'post_type', 'post_mime_type',
+    'comment_count',
+)
+_POST_INDEX = {name: i for i, name in enumerate(POST_COLUMNS)}
+
+# Stock WordPress column order of the tables the extractors read, used when
+# a dump has neither CREATE TABLE statements nor INSERT column lists
+TABLE_COLUMNS = {
+    'wp_posts': POST_COLUMNS,
+    'wp_postmeta': ('meta_id', 'post_id', 'meta_key', 'meta_value'),
+    'wp_terms': ('term_id', 'name', 'slug', 'term_group'),
+    'wp_term_taxonomy': ('term_taxonomy_id', 'term_id', 'taxonomy', 'description', 'parent', 'count'),
+    'wp_term_relationships': ('object_id', 'term_taxonomy_id', 'term_order'),
+}
+
+class RowDecoder:
+    """
+    Row layout of one table, compiled for the columns a consumer wants.
+
+    fields holds an (index, decoder) pair per wanted column, in the order
+    asked for: index is where the column sits in the table's rows and
+    decoder turns its raw bytes into a value. Columns the table lacks get
+    index -1 and decode to their default. Built once per table layout, so
+    rows are decoded without looking up any column by name.
+    """
+
+    __slots__ = ('columns', 'fields', 'defaults', 'width')
+
+    def __init__(self, columns, wanted, decoders=None, defaults=None, decoder=decode_field):
+        self.columns = columns
+        position = {name: i for i, name in enumerate(columns)}
+        decoders = decoders or {}
+        defaults = defaults or {}
+        self.fields = tuple((position.get(name, -1), decoders.get(name, decoder)) for name in wanted)
+        self.defaults = tuple(defaults.get(name, '') for name in wanted)
+        # Rows with fewer fields than the table has columns are malformed
+        self.width = len(columns)
+
+    def decode(self, data, bounds, i):
+        """Decode the i-th wanted column of one row"""
+        index, decoder = self.fields[i]
+        if index < 0:
+            return self.defaults[i]
+        return decoder(data[bounds[index]:bounds[index + 1] - 1])
+
+    def __call__(self, data, bounds):
+        """Decode every wanted column of one row, as a list"""
+        return [decoder(data[bounds[index]:bounds[index + 1] - 1]) if index >= 0 else default
+                for (index, decoder), default in zip(self.fields, self.defaults)]
+
+# Low-cardinality columns whose decoded values are shared through sys.intern
+_POST_DECODERS = dict.fromkeys(
+    ('post_status', 'comment_status', 'ping_status', 'post_type', 'post_mime_type'),
+    decode_interned,
+)
+_POST_DEFAULTS = {'comment_count': '0'}
+# The columns collect_posts keeps from each table
+_WANTED_COLUMNS = {
+    'wp_posts': POST_COLUMNS,
+    'wp_postmeta': ('post_id', 'meta_key', 'meta_value'),
+    'wp_terms': TABLE_COLUMNS['wp_terms'],
+    'wp_term_taxonomy': TABLE_COLUMNS['wp_term_taxonomy'],
+    'wp_term_relationships': ('object_id', 'term_taxonomy_id'),
+}
+_ROW_DECODERS = {}
+
+def row_decoder(table, columns=None):
+    """
+    RowDecoder for the wanted columns of a table collect_posts reads, its
+    rows laid out as columns (the stock WordPress order when None).
+    """
+    key = (table, columns)
+    decoder = _ROW_DECODERS.get(key)
+    if decoder is None:
+        layout = columns or TABLE_COLUMNS[table]
+        if table == 'wp_posts':
+            decoder = RowDecoder(layout, POST_COLUMNS, _POST_DECODERS, _POST_DEFAULTS)
+        else:
+            decoder = RowDecoder(layout, _WANTED_COLUMNS[table])
+        _ROW_DECODERS[key] = decoder
+    return decoder
+
+def row_digest(data, bounds):
+    """Hash of one row's raw bytes in the dump"""
+    return hashlib.blake2b(data[bounds[0]:bounds[-1]], digest_size=16).digest()
+
+class Post(Mapping):
+    """
+    A wp_posts row whose fields are decoded on first access.
+
+    Keeps the buffer the row was tokenized from (the mmap of the dump, or a
+    copy of just the row) and the field bounds within it, so filtering on
+    post_type/post_status never decodes post_content. Reads like the dict
+    this module used to build, 'meta' included; json_default turns it back
+    into one for json.dump.
+
+    Rows are kept small: no instance __dict__, bounds in an array, decoded
+    values cached in a list by column, status/type strings interned, and no
+    dicts allocated until a row has meta or extra keys. Where each column
+    sits in the row comes from a RowDecoder shared by every row of the same
+    layout.
+    """
+
+    __slots__ = ('_data', '_bounds', '_layout', '_values', '_meta', '_extra', '_digest')
+
+    def __init__(self, data, bounds, layout=None, digest=None):
+        self._data = data
+        self._bounds = bounds
+        self._layout = layout or row_decoder('wp_posts')
+        self._values = [None] * len(POST_COLUMNS)
+        self._meta = None
+        self._extra = None
+        self._digest = digest
+
+    @classmethod
+    def from_values(cls, values, meta, extra=None, digest=None):
+        """Rebuild an already decoded post, e.g. after pickling"""
+        post = cls(None, ())
+        post._values = values
+        post._meta = meta
+        post._extra = extra
+        post._digest = digest
+        return post
+
+    def release(self):
+        """Drop decoded values; they are decoded again from the dump if needed"""
+        if self._data is not None:
+            self._values = [None] * len(POST_COLUMNS)
+
+    def row_digest(self):
+        """Hash of the row's raw bytes in the dump, computed without decoding"""
+        if self._digest is not None:
+            return self._digest
+        return row_digest(self._data, self._bounds)
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            self._meta = {}
+        return self._meta
+
+    @meta.setter
+    def meta(self, value):
+        self._meta = value
+
+    def _decode(self, index):
+        value = self._layout.decode(self._data, self._bounds, index)
+        self._values[index] = value
+        return value
+
+    def __getitem__(self, key):
+        index = _POST_INDEX.get(key)
+        if index is not None:
+            value = self._values[index]
+            return self._decode(index) if value is None else value
+        if key == 'meta':
+            return self.meta
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        index = _POST_INDEX.get(key)
+        if index is not None:
+            self._values[index] = value
+        elif key == 'meta':
+            self._meta = value
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __iter__(self):
+        yield from POST_COLUMNS
+        yield 'meta'
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return len(POST_COLUMNS) + 1 + (len(self._extra) if self._extra else 0)
+
+    def raw(self, key):
+        """
+        A column's bytes as they are in the dump, undecoded, or its decoded
+        value where there are none (a rebuilt post, a missing column)
+        """
+        index = _POST_INDEX[key]
+        column = self._layout.fields[index][0]
+        if self._data is None or column < 0 or self._values[index] is not None:
+            return self[key]
+        return bytes(self._data[self._bounds[column]:self._bounds[column + 1] - 1])
+
+    def to_dict(self):
+        """Decode every field into a plain dict"""
+        return {key: self[key] for key in self}
+
+    def __reduce__(self):
+        # A pickled post travels fully decoded; the buffer stays behind
+        values = [self[key] for key in POST_COLUMNS]
+        return Post.from_values, (values, self._meta, self._extra, self.row_digest())
+
+def json_default(obj):
+    """json.dump hook for Post"""
+    if isinstance(obj, Post):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# Leading bytes of each compressed format open_dump understands
+_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'(\xb5/\xfd', 'zstd'),
+    (b'BZh', 'bz2'),
+)
+
+def dump_compression(sql_file):
+    """Compression of a dump going by its magic bytes, or None if plain"""
+    with open(sql_file, 'rb') as f:
+        head = f.read(6)
+    for magic, name in _MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+def open_dump(sql_file):
+    """
+    Open a dump as a binary stream, decompressing gzip, xz, bz2 or zstd on
+    the fly so nothing is written to disk. zstd needs Python 3.14's
+    compression.zstd or the zstandard package.
+    """
+    compression = dump_compression(sql_file)
+    if compression == 'gzip':
+        return gzip.open(sql_file, 'rb')
+    if compression == 'xz':
+        return lzma.open(sql_file, 'rb')
+    if compression == 'bz2':
+        return bz2.open(sql_file, 'rb')
+    if compression == 'zstd':
+        try:
+            from compression import zstd
+            return zstd.open(sql_file, 'rb')
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit(f"{sql_file} is zstd-compressed: pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().stream_reader(open(sql_file, 'rb'), closefd=True)
+    return open(sql_file, 'rb')
+
+POST_TABLES = ('wp_posts', 'wp_postmeta')
+
+def php_unserialize(data):
+    """
+    Decode a PHP serialize() string (str or bytes): arrays, strings, ints,
+    floats, booleans and null. Arrays keyed 0..n-1 become lists, others
+    dicts. Raises ValueError on anything else, objects included, and on
+    strings whose byte lengths don't add up.
+    """
+    raw = data.encode('utf-8') if isinstance(data, str) else data
+    try:
+        value, pos = _php_value(raw, 0)
+    except RecursionError:
+        raise ValueError("PHP value nested too deeply")
+    if pos != len(raw):
+        raise ValueError(f"Trailing data after PHP value at byte {pos}")
+    return value
+
+def _php_value(raw, pos):
+    """Decode the PHP value at raw[pos:], returning it and the position after it"""
+    kind = raw[pos:pos + 2]
+    if kind == b'N;':
+        return None, pos + 2
+    if kind == b's:':
+        colon = raw.index(b':', pos + 2)
+        start = colon + 2
+        end = start + int(raw[pos + 2:colon])
+        if raw[colon + 1:start] != b'"' or raw[end:end + 2] != b'";':
+            raise ValueError(f"Bad PHP string at byte {pos}")
+        return raw[start:end].decode('utf-8', 'ignore'), end + 2
+    if kind in (b'i:', b'd:', b'b:'):
+        end = raw.index(b';', pos + 2)
+        text = raw[pos + 2:end]
+        if kind == b'i:':
+            value = int(text)
+        elif kind == b'd:':
+            value = float(text)
+        elif text in (b'0', b'1'):
+            value = text == b'1'
+        else:
+            raise ValueError(f"Bad PHP boolean at byte {pos}")
+        return value, end + 1
+    if kind == b'a:':
+        colon = raw.index(b':', pos + 2)
+        count = int(raw[pos + 2:colon])
+        if raw[colon + 1:colon + 2] != b'{':
+            raise ValueError(f"Bad PHP array at byte {pos}")
+        pos = colon + 2
+        keys = []
+        values = []
+        for _ in range(count):
+            key, pos = _php_value(raw, pos)
+            if not isinstance(key, (int, str)) or isinstance(key, bool):
+                raise ValueError(f"Bad PHP array key at byte {pos}")
+            value, pos = _php_value(raw, pos)
+            keys.append(key)
+            values.append(value)
+        if raw[pos:pos + 1] != b'}':
+            raise ValueError(f"Unterminated PHP array at byte {pos}")
+        if keys == list(range(count)):
+            return values, pos + 1
+        return dict(zip(keys, values)), pos + 1
+    raise ValueError(f"Unsupported PHP value at byte {pos}")
+
+# How every value PHP's serialize() writes begins
+_PHP_SERIALIZED = ('a:', 's:', 'i:', 'd:', 'b:', 'N;')
+
+def maybe_unserialize(value):
+    """value decoded if it holds a PHP-serialized array or scalar, else as is"""
+    if value[:2] in _PHP_SERIALIZED and value[-1:] in (';', '}'):
+        try:
+            return php_unserialize(value)
+        except ValueError:
+            pass
+    return value
+
+def _unescape_strings(value):
+    """value with html.unescape applied to every string in it, keys left alone"""
+    if isinstance(value, str):
+        return html.unescape(value) if '&' in value else value
+    if isinstance(value, list):
+        return [_unescape_strings(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _unescape_strings(item) for key, item in value.items()}
+    return value
+
+def decode_meta_value(text):
+    """
+    A meta value, SQL-unescaped but with its HTML entities, as the value
+    kept meta holds: unserialized if it is PHP-serialized, then HTML
+    entities decoded in its strings. Unserializing comes first because
+    the s:N: lengths count the entities' bytes.
+    """
+    value = maybe_unserialize(text)
+    if value is text:
+        return html.unescape(text) if '&' in text else text
+    return _unescape_strings(value)
+
+# Meta keys whose raw string values are kept SQL-unescaped only, entities
+# and all, when meta isn't filtered: they hold PHP-serialized data whose
+# s:N: lengths count the entities' bytes, which decode_meta_value reads
+SERIALIZED_META_KEYS = frozenset({'_wp_attachment_metadata'})
+
+DEFAULT_META_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extract_meta.json')
+
+class MetaFilter:
+    """
+    Which meta keys to keep: those matching an allow pattern, or any key if
+    there are none, unless they match a deny pattern. Patterns are
+    case-sensitive fnmatch globs such as '_et_pb_*'.
+
+    Verdicts are cached by the key's raw bytes in the dump, so a row whose
+    key is filtered out is dropped without decoding any of its fields.
+    """
+
+    # Stop caching raw keys past this many, in case a plugin makes them unique
+    MAX_CACHED = 100000
+
+    def __init__(self, allow=(), deny=()):
+        self.allow = tuple(allow)
+        self.deny = tuple(deny)
+        self._verdicts = {}
+
+    def keeps(self, key):
+        """Whether to keep the decoded meta_key key"""
+        if self.allow and not any(fnmatchcase(key, pattern) for pattern in self.allow):
+            return False
+        return not any(fnmatchcase(key, pattern) for pattern in self.deny)
+
+    def keeps_raw(self, raw):
+        """Whether to keep a meta_key field as it appears in the dump"""
+        verdict = self._verdicts.get(raw)
+        if verdict is None:
+            verdict = self.keeps(decode_field(raw))
+            if len(self._verdicts) < self.MAX_CACHED:
+                self._verdicts[raw] = verdict
+        return verdict
+
+def load_meta_rules(path=DEFAULT_META_RULES):
+    """MetaFilter from JSON of the form {"allow": [...], "deny": [...]}"""
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    return MetaFilter(rules.get('allow', ()), rules.get('deny', ()))
+
+TAXONOMY_TABLES = ('wp_terms', 'wp_term_taxonomy', 'wp_term_relationships')
+# Taxonomies attached to posts, and the post key each goes under
+POST_TAXONOMIES = {'category': 'categories', 'post_tag': 'tags'}
+
+class Taxonomy:
+    """
+    wp_terms, wp_term_taxonomy and wp_term_relationships of a dump, joined
+    in memory with hash lookups.
+
+    terms and term_taxonomy hold rows as dicts keyed by term_id and
+    term_taxonomy_id; relationships holds (object_id, term_taxonomy_id)
+    pairs in dump order. Relationships are joined to their terms in one pass
+    over them, so the cost is linear in the size of the three tables.
+    """
+
+    def __init__(self):
+        self.terms = {}
+        self.term_taxonomy = {}
+        self.relationships = []
+        self._post_terms = None
+
+    def add(self, table, values):
+        """Add a row of one of TAXONOMY_TABLES, its columns as in _WANTED_COLUMNS"""
+        if table == 'wp_term_relationships':
+            self.relationships.append(tuple(values))
+        elif table == 'wp_term_taxonomy':
+            self.term_taxonomy[values[0]] = dict(zip(TABLE_COLUMNS[table], values))
+        else:
+            self.terms[values[0]] = dict(zip(TABLE_COLUMNS[table], values))
+        self._post_terms = None
+
+    def update(self, other):
+        """Add the rows of another Taxonomy read from a later part of the dump"""
+        self.terms.update(other.terms)
+        self.term_taxonomy.update(other.term_taxonomy)
+        self.relationships.extend(other.relationships)
+        self._post_terms = None
+
+    def __bool__(self):
+        return bool(self.term_taxonomy)
+
+    def __len__(self):
+        return len(self.term_taxonomy)
+
+    def term_list(self):
+        """Every wp_term_taxonomy row merged with its wp_terms row"""
+        return [{**self.terms[row['term_id']], **row}
+                for row in self.term_taxonomy.values() if row['term_id'] in self.terms]
+
+    def post_terms(self):
+        """
+        {object_id: {taxonomy: [term, ...]}}, each term a dict of term_id,
+        name, slug and parent term_id shared by every post that has it.
+        """
+        if self._post_terms is None:
+            resolved = {}
+            for term_taxonomy_id, row in self.term_taxonomy.items():
+                term = self.terms.get(row['term_id'])
+                if term is not None:
+                    resolved[term_taxonomy_id] = (row['taxonomy'], {
+                        'term_id': term['term_id'],
+                        'name': term['name'],
+                        'slug': term['slug'],
+                        'parent': row['parent'],
+                    })
+
+            self._post_terms = defaultdict(lambda: defaultdict(list))
+            for object_id, term_taxonomy_id in self.relationships:
+                hit = resolved.get(term_taxonomy_id)
+                if hit is not None:
+                    self._post_terms[object_id][hit[0]].append(hit[1])
+        return self._post_terms
+
+    def attach(self, posts):
+        """Set the POST_TAXONOMIES keys of each post to its terms, [] if none"""
+        post_terms = self.post_terms()
+        for post in posts:
+            terms = post_terms.get(post['ID'], {})
+            for taxonomy, key in POST_TAXONOMIES.items():
+                post[key] = terms.get(taxonomy, [])
+
+    def descendants(self, slugs):
+        """The given term slugs plus those of every term nested below them"""
+        children = defaultdict(list)
+        for row in self.term_taxonomy.values():
+            children[row['parent']].append(row['term_id'])
+        slug_ids = defaultdict(list)
+        for term_id, term in self.terms.items():
+            slug_ids[term['slug']].append(term_id)
+
+        found = set(slugs)
+        pending = [term_id for slug in found for term_id in slug_ids.get(slug, ())]
+        seen = set(pending)
+        while pending:
+            for child in children.get(pending.pop(), ()):
+                if child not in seen and child in self.terms:
+                    seen.add(child)
+                    found.add(self.terms[child]['slug'])
+                    pending.append(child)
+        return found
+
+def _raw_meta_value(decoder, data, bounds):
+    """A wp_postmeta row's meta_value, SQL-unescaped only"""
+    index = decoder.fields[2][0]
+    if index < 0:
+        return ''
+    return decode_sql_field(data[bounds[index]:bounds[index + 1] - 1])
+
+def decode_rows(tuples, columns=None, meta_filter=None, metrics=None):
+    """
+    Decoder stage: turn (table, data, bounds) tuples into (table, value)
+    pairs. wp_posts rows become Posts, decoded lazily; wp_postmeta rows
+    become (post_id, meta_key, meta_value); taxonomy rows become lists in
+    the _WANTED_COLUMNS order Taxonomy.add takes.
+
+    columns is the dict the tuples' scanner records column orders in; tables
+    missing from it are read with the stock WordPress layout. With a
+    MetaFilter, meta rows it rejects are skipped before anything in them is
+    decoded, and kept values go through decode_meta_value; without one,
+    values are decoded like any field, except for SERIALIZED_META_KEYS.
+    metrics, if given, gets each table's rows and tuple bytes, filtered rows
+    included, once the tuples run out.
+    """
+    if columns is None:
+        columns = {}
+
+    # [rows, bytes] per table
+    scanned = defaultdict(lambda: [0, 0])
+    table_seen = layout = decoder = counts = None
+    for table, data, bounds in tuples:
+        # The layout only changes between statements; recompile only then
+        if table is not table_seen or columns.get(table) is not layout:
+            table_seen = table
+            layout = columns.get(table)
+            decoder = row_decoder(table, layout)
+            counts = scanned[table]
+        counts[0] += 1
+        counts[1] += bounds[-1] - bounds[0]
+        if len(bounds) <= decoder.width:
+            continue
+
+        if table == 'wp_posts':
+            yield table, Post(data, bounds, decoder)
+        elif table == 'wp_postmeta':
+            if meta_filter is None:
+                row = tuple(decoder(data, bounds))
+                if row[1] in SERIALIZED_META_KEYS:
+                    row = row[:2] + (_raw_meta_value(decoder, data, bounds),)
+                yield table, row
+                continue
+            key_index = decoder.fields[1][0]
+            if not meta_filter.keeps_raw(data[bounds[key_index]:bounds[key_index + 1] - 1]):
+                continue
+            meta_value = decode_meta_value(_raw_meta_value(decoder, data, bounds))
+            yield table, (decoder.decode(data, bounds, 0), decoder.decode(data, bounds, 1), meta_value)
+        else:
+            yield table, decoder(data, bounds)
+
+    if metrics is not None:
+        for table, (rows, nbytes) in scanned.items():
+            metrics.table(table, rows, nbytes)
+
+def gather_rows(decoded, taxonomy=None):
+    """
+    Collect decode_rows output into (posts, postmeta), postmeta mapping
+    post_id to {meta_key: meta_value}. Taxonomy rows go into taxonomy if
+    given and are dropped otherwise.
+    """
+    posts = []
+    postmeta = defaultdict(dict)
+    for table, value in decoded:
+        if table == 'wp_posts':
+            posts.append(value)
+        elif table == 'wp_postmeta':
+            post_id, meta_key, meta_value = value
+            postmeta[post_id][meta_key] = meta_value
+        elif taxonomy is not None:
+            taxonomy.add(table, value)
+    return posts, postmeta
+
+def collect_posts(tuples, columns=None, taxonomy=None, meta_filter=None, metrics=None):
+    """
+    Build posts and their metadata from (table, data, bounds) tuples, adding
+    rows of the taxonomy tables to taxonomy if given. columns and
+    meta_filter are as for decode_rows. metrics, if given, gets the rows
+    and bytes of each table and times producing the tuples, decoding them
+    and gathering the rows as scan.tokenize, scan.decode and scan.gather.
+    """
+    if metrics is None:
+        return gather_rows(decode_rows(tuples, columns, meta_filter), taxonomy)
+    tuples = metrics.stage(tuples, 'scan.tokenize')
+    decoded = metrics.stage(decode_rows(tuples, columns, meta_filter, metrics), 'scan.decode',
+                            'scan.tokenize')
+    with metrics.phase('scan.gather', 'scan.decode'):
+        return gather_rows(decoded, taxonomy)
+
+def attach_meta(posts, postmeta):
+    """Set each post's meta to its postmeta entry, where it has one"""
+    for post in posts:
+        post_id = post['ID']
+        if post_id in postmeta:
+            post['meta'] = postmeta[post_id]
+
+def join_posts(decoded, taxonomy=None):
+    """
+    Joiner stage: read every decoded row, then yield the posts in dump order
+    with their meta attached and, given a Taxonomy, their categories and
+    tags. Meta and terms may follow the posts in a dump, so nothing comes
+    out before the input is exhausted.
+    """
+    posts, postmeta = gather_rows(decoded, taxonomy)
+    attach_meta(posts, postmeta)
+    if taxonomy is not None:
+        taxonomy.attach(posts)
+    yield from posts
+
+_STATEMENT_PREFIXES = {'insert': b'INSERT INTO `', 'create': b'CREATE TABLE `'}
+INDEX_SUFFIX = '.index.json'
+INDEX_VERSION = 1
+
+def scan_statements(data, start=0, end=None):
+    """
+    Return (kind, table, start, end) for every CREATE TABLE and INSERT
+    statement in data (bytes or an mmap), in file order, kind being 'create'
+    or 'insert'. start and end limit the search to data[start:end], start
+    being the beginning of a line.
+
+    Statements are found with bytes.find on their line prefix, never looking
+    inside them. An INSERT runs up to the next statement, so it may carry
+    trailing lines such as UNLOCK TABLES that the tuple scanner skips anyway;
+    a CREATE TABLE ends at the ';' closing its last line.
+    """
+    limit = len(data) if end is None else end
+    starts = []
+    for kind, prefix in _STATEMENT_PREFIXES.items():
+        if data[start:start + len(prefix)] == prefix:
+            starts.append((start, kind))
+        needle = b'\n' + prefix
+        pos = data.find(needle, start, limit)
+        while pos >= 0:
+            starts.append((pos + 1, kind))
+            pos = data.find(needle, pos + 1, limit)
+    starts.sort()
+
+    statements = []
+    for i, (start, kind) in enumerate(starts):
+        name_start = start + len(_STATEMENT_PREFIXES[kind])
+        name_end = data.find(b'`', name_start, limit)
+        table = data[name_start:name_end].decode('utf-8', 'ignore')
+        end = starts[i + 1][0] if i + 1 < len(starts) else limit
+        if kind == 'create':
+            close_at = _CREATE_END_RE.search(data, name_end, end)
+            if close_at:
+                end = close_at.start() + 1
+        statements.append((kind, table, start, end))
+    return statements
+
+def build_statement_index(data):
+    """
+    Map each table to the byte ranges of its statements:
+    {table: {'create': [start, end] or None, 'inserts': [[start, end], ...]}}
+    """
+    tables = {}
+    for kind, table, start, end in scan_statements(data):
+        entry = tables.setdefault(table, {'create': None, 'inserts': []})
+        if kind == 'create':
+            entry['create'] = [start, end]
+        else:
+            entry['inserts'].append([start, end])
+    return tables
+
+def load_statement_index(sql_file, data):
+    """
+    Return the statement index of an uncompressed dump mapped as data.
+
+    The index is cached as <dump>.index.json and reused while the dump's size
+    and mtime are unchanged, so later runs jump straight to the tables they
+    need instead of reading the whole file. A cache that cannot be written
+    (read-only directory) is simply rebuilt next time.
+    """
+    index_file = sql_file + INDEX_SUFFIX
+    stat = os.stat(sql_file)
+    key = {'version': INDEX_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if all(cached.get(k) == v for k, v in key.items()):
+            print(f"Using statement index {index_file}")
+            return cached['tables']
+    except (OSError, ValueError):
+        pass
+
+    print("Indexing statements...")
+    tables = build_statement_index(data)
+    try:
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({**key, 'tables': tables}, f)
+        os.replace(tmp_file, index_file)
+    except OSError as e:
+        print(f"  Could not cache the index: {e}")
+    return tables
+
+def table_ranges(index, tables):
+    """Byte ranges of the given tables' INSERT statements, in file order"""
+    ranges = []
+    for table in tables:
+        if table in index:
+            ranges.extend(index[table]['inserts'])
+    ranges.sort()
+    return [tuple(r) for r in ranges]
+
+def index_columns(data, index, tables):
+    """Column order of each of the tables, read from its indexed CREATE TABLE"""
+    columns = {}
+    for table in tables:
+        create = index.get(table, {}).get('create')
+        if create:
+            names = parse_create_columns(data[create[0]:create[1]])
+            if names:
+                columns[table] = names
+    return columns
+
+def plan_ranges(index, tables, parts):
+    """
+    Group the statements of the given tables into about `parts` contiguous
+    byte ranges of similar size, in file order.
+    """
+    selected = table_ranges(index, tables)
+    total = sum(end - start for start, end in selected)
+    target = max(total // max(parts, 1), 1)
+
+    ranges = []
+    for start, end in selected:
+        if ranges and ranges[-1][1] == start and ranges[-1][1] - ranges[-1][0] < target:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return [tuple(r) for r in ranges]
+
+def _extract_range(task):
+    """
+    Worker: parse the posts, postmeta and taxonomy statements in one byte
+    range. Posts come back undecoded, as (columns, bounds, digest) with
+    bounds absolute in the file, for the parent to rebuild over its own
+    map of it. With measure set, also returns the range's table counts and
+    scan phase times, as plain dicts.
+    """
+    sql_file, start, end, tables, columns, meta_filter, measure = task
+    taxonomy = Taxonomy()
+    metrics = Metrics() if measure else None
+    with open(sql_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        tuples = iter_buffer_tuples(mm, tables, start, end, columns)
+        posts, postmeta = collect_posts(tuples, columns, taxonomy, meta_filter, metrics)
+        posts = [(post._layout.columns, post._bounds, post.row_digest()) for post in posts]
+    stats = None
+    if metrics is not None:
+        stats = ({table: dict(counts) for table, counts in metrics.tables.items()}, dict(metrics.phases))
+    return posts, dict(postmeta), taxonomy, stats
+
+def collect_posts_parallel(sql_file, workers, taxonomy=None, meta_filter=None, metrics=None):
+    """
+    Parse posts and postmeta, and the taxonomy tables into taxonomy if
+    given, with a process pool. meta_filter is applied as in collect_posts.
+
+    Statement offsets come from the cached statement index; each worker then
+    maps the file itself and parses its own range. Workers send back where
+    each post's fields are rather than their values, and the posts are
+    rebuilt over this process's map of the file, so they decode lazily as
+    on the serial path. Results are merged in file order, so the output
+    matches the serial path. metrics, if given, gets
+    the dump size and every range's table counts; the workers' scan.*
+    phases are added up, so they total CPU time rather than wall time.
+    """
+    tables = POST_TABLES + TAXONOMY_TABLES if taxonomy is not None else POST_TABLES
+    # Left open: the posts keep reading their fields from it
+    with open(sql_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    index = load_statement_index(sql_file, mm)
+    columns = index_columns(mm, index, tables)
+
+    # A few ranges per worker keeps the pool busy when statement sizes vary
+    ranges = plan_ranges(index, tables, workers * 4)
+    print(f"Parsing {len(ranges)} ranges with {workers} workers...")
 
     posts = []
     postmeta = defaultdict(dict)
+    measure = metrics is not None
+    if measure:
+        metrics.count('dump_bytes', os.path.getsize(sql_file))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = [(sql_file, start, end, tables, dict(columns), meta_filter, measure)
+                 for start, end in ranges]
+        for range_posts, range_meta, range_taxonomy, stats in pool.map(_extract_range, tasks):
+            posts.extend(Post(mm, bounds, row_decoder('wp_posts', layout), digest)
+                         for layout, bounds, digest in range_posts)
+            for post_id, meta in range_meta.items():
+                postmeta[post_id].update(meta)
+            if taxonomy is not None:
+                taxonomy.update(range_taxonomy)
+            if stats is not None:
+                counts, phases = stats
+                for table, table_counts in counts.items():
+                    metrics.table(table, table_counts['rows'], table_counts['bytes'])
+                for name, seconds in phases.items():
+                    metrics.phases[name] += seconds
+    return posts, postmeta
+
+METRICS_FILE = 'extraction-metrics.json'
+PROFILE_FILE = 'extraction-profile.prof'
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+def peak_rss():
+    """This process's peak resident set size in bytes, or None where unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Metrics:
+    """
+    Timers, counters and progress for one extraction, passed down as an
+    optional metrics argument. Timers wrap whole phases and progress is
+    checked once every few thousand rows, so runs without a Metrics pay
+    nothing and runs with one next to nothing.
+
+    profile is None, 'cprofile' or 'tracemalloc': start_profile and
+    stop_profile then bracket the run and to_dict reports the top entries.
+    """
+
+    # Rows between looks at the clock, and seconds between progress lines
+    CHECK_EVERY = 4096
+    PROGRESS_INTERVAL = 2.0
+
+    def __init__(self, progress=False, profile=None, stream=None):
+        self.progress = progress
+        self.profile = profile
+        self.stream = stream or sys.stderr
+        self.phases = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.tables = defaultdict(lambda: {'rows': 0, 'bytes': 0})
+        self.profile_report = None
+        self._profiler = None
+        self._started = time.perf_counter()
+        # Time spent in each stage() including the stages it pulls from
+        self._inclusive = defaultdict(float)
+
+    @contextmanager
+    def phase(self, name, inner=None):
+        """
+        Time a block, adding to any earlier time under the same name. With
+        inner, the time the stage of that name took meanwhile is left out.
+        """
+        start = time.perf_counter()
+        before = self._inclusive[inner] if inner else 0.0
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if inner:
+                elapsed -= self._inclusive[inner] - before
+            self.phases[name] += elapsed
+
+    def stage(self, items, name, inner=None):
+        """
+        Pass items through, timing every next() on them as phase name. With
+        inner, the name of the stage items pull from, that stage's time is
+        left out, so each stage of a generator chain reports its own share.
+        Costs two clock reads per item, hence only used with metrics on.
+        """
+        clock = time.perf_counter
+        inclusive = self._inclusive
+        items = iter(items)
+        own = 0.0
+        try:
+            while True:
+                start = clock()
+                before = inclusive[inner] if inner else 0.0
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = clock() - start
+                    inclusive[name] += elapsed
+                    own += elapsed - (inclusive[inner] - before if inner else 0.0)
+                yield item
+        finally:
+            self.phases[name] += own
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def table(self, table, rows=0, nbytes=0):
+        stats = self.tables[table]
+        stats['rows'] += rows
+        stats['bytes'] += nbytes
+
+    def track(self, tuples, total=None, position=None):
+        """
+        Pass (table, data, bounds) tuples through, printing bytes/s, rows/s
+        and an ETA every PROGRESS_INTERVAL seconds. position(item) gives how
+        far into a dump of total bytes an item is, when that is known.
+        """
+        if not self.progress:
+            yield from tuples
+            return
+        start = last = time.perf_counter()
+        rows = 0
+        check = self.CHECK_EVERY
+        for item in tuples:
+            yield item
+            rows += 1
+            if rows == check:
+                check += self.CHECK_EVERY
+                now = time.perf_counter()
+                if now - last >= self.PROGRESS_INTERVAL:
+                    last = now
+                    self._report_progress(rows, position(item) if position else None, total, now - start)
+
+    def _report_progress(self, rows, done, total, elapsed):
+        line = f"  {rows:,} rows  {rows / elapsed:,.0f} rows/s"
+        if done is not None:
+            rate = done / elapsed
+            line += f"  {done / (1024 * 1024):,.0f} MB  {rate / (1024 * 1024):.1f} MB/s"
+            if total and rate:
+                line = f"  {100 * done / total:5.1f}%" + line + f"  ETA {(total - done) / rate:.0f}s"
+        print(line, file=self.stream, flush=True)
+
+    def start_profile(self):
+        if self.profile == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.profile == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.start()
+
+    def stop_profile(self, output_dir, top=25):
+        """Stop profiling and keep its top entries; cProfile stats also go to PROFILE_FILE"""
+        if self.profile == 'cprofile' and self._profiler is not None:
+            import pstats
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler)
+            stats.dump_stats(os.path.join(output_dir, PROFILE_FILE))
+            entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            self.profile_report = {
+                'mode': 'cprofile',
+                'stats_file': PROFILE_FILE,
+                'top_cumulative': [
+                    {'function': f"{os.path.basename(file)}:{line}({name})", 'calls': calls,
+                     'total': round(total, 6), 'cumulative': round(cumulative, 6)}
+                    for (file, line, name), (_, calls, total, cumulative, _) in entries],
+            }
+        elif self.profile == 'tracemalloc':
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                return
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.profile_report = {
+                'mode': 'tracemalloc',
+                'current': current,
+                'peak': peak,
+                'top_allocations': [
+                    {'where': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+                    for stat in snapshot.statistics('lineno')[:top]],
+            }
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self._started
+        rows = sum(stats['rows'] for stats in self.tables.values())
+        load = self.phases.get('load') or elapsed
+        report = {
+            'elapsed': round(elapsed, 6),
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'counters': dict(self.counters),
+            'tables': {table: dict(stats) for table, stats in self.tables.items()},
+            'throughput': {
+                'mb_per_s': self.counters.get('dump_bytes', 0) / (1024 * 1024) / load,
+                'rows_per_s': rows / load,
+            },
+            'peak_rss': peak_rss(),
+        }
+        if self.profile_report:
+            report['profile'] = self.profile_report
+        return report
+
+    def write(self, path):
+        """Write to_dict() to path as JSON, returning the report written"""
+        report = self.to_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+def timed(metrics, name, inner=None):
+    """metrics.phase(name, inner), or a context that does nothing without metrics"""
+    return metrics.phase(name, inner) if metrics is not None else nullcontext()
+
+def read_mapped(sql_file, tables=None, metrics=None):
+    """
+    Reader stage for plain dumps: yield (data, start, end) spans of the
+    mapped dump, one per CREATE TABLE and INSERT statement of the given
+    tables (all when None) in file order. Statements are located through the
+    cached statement index, so the rest of the dump is never read, and
+    nothing is copied. metrics, if given, times the index as scan.index.
+    """
+    if not os.path.getsize(sql_file):
+        return
+    with open(sql_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with timed(metrics, 'scan.index'):
+        index = load_statement_index(sql_file, mm)
+    ranges = []
+    for table in index if tables is None else tables:
+        entry = index.get(table)
+        if entry is None:
+            continue
+        if entry['create']:
+            ranges.append(entry['create'])
+        ranges.extend(entry['inserts'])
+    for start, end in sorted(ranges):
+        yield mm, start, end
+
+def read_stream(sql_file, tables=None, columns=None, metrics=None):
+    """
+    Reader, splitter and tokenizer in one for compressed dumps: yield
+    (table, data, bounds) for each row of the given tables as
+    iter_insert_tuples does on the decompressed stream. A stream can't be
+    cut into statements without holding a whole statement, so the chunked
+    scanner carries partial tuples across reads instead and memory stays
+    flat however long a statement is. metrics, if given, counts the
+    decompressed size as dump_bytes.
+    """
+    with open_dump(sql_file) as f:
+        yield from iter_insert_tuples(f, tables, columns=columns)
+        if metrics is not None:
+            metrics.count('dump_bytes', f.tell())
+
+def split_statements(spans):
+    """
+    Splitter stage: yield (kind, table, data, start, end) for each CREATE
+    TABLE and INSERT statement in (data, start, end) spans, as in
+    scan_statements.
+    """
+    for data, start, end in spans:
+        for kind, table, first, last in scan_statements(data, start, end):
+            yield kind, table, data, first, last
+
+def tokenize_statements(statements, tables=None, columns=None):
+    """
+    Row tokenizer stage: yield (table, data, bounds) for each VALUES tuple of
+    the given tables' INSERT statements, with field bounds as in
+    iter_insert_tuples. Column orders go into columns from CREATE TABLE
+    statements and INSERT column lists. Tuples point into the statements'
+    data, as with iter_buffer_tuples.
+    """
+    for kind, table, data, start, end in statements:
+        if tables is not None and table not in tables:
+            continue
+        if kind == 'create':
+            names = parse_create_columns(data[start:end])
+            if names and columns is not None:
+                columns[table] = names
+            continue
+        yield from iter_buffer_tuples(data, tables, start, end, columns)
+
+def iter_dump_tuples(sql_file, tables, columns=None, metrics=None):
+    """
+    (table, data, bounds) for every row of the given tables in a dump: the
+    reader, splitter and tokenizer stages composed.
+
+    Plain dumps are mapped and only the tables' statements are scanned,
+    through the statement index; posts built from those rows keep offsets
+    into the mapping. Compressed dumps go through read_stream, decompressed
+    while tokenizing, and each row is a copy. Column orders go into columns
+    as with iter_insert_tuples. metrics, if given, times the index, tracks
+    progress and counts the dump's (decompressed) size as dump_bytes.
+    """
+    if dump_compression(sql_file):
+        tuples = read_stream(sql_file, tables, columns, metrics)
+        return tuples if metrics is None else metrics.track(tuples)
+    tuples = tokenize_statements(split_statements(read_mapped(sql_file, tables, metrics)), tables, columns)
+    if metrics is None:
+        return tuples
+    metrics.count('dump_bytes', os.path.getsize(sql_file))
+    return metrics.track(tuples, os.path.getsize(sql_file), lambda item: item[2][-1])
+
+def process_sql_file(sql_file, workers=1, taxonomy=None, meta_filter=None, metrics=None):
+    """
+    Stream the SQL file and collect posts with their metadata. Given a
+    Taxonomy, the taxonomy tables are read into it in the same pass and
+    each post gets its categories and tags. Given a MetaFilter, only the
+    meta it keeps is decoded, PHP-serialized values included. Given a
+    Metrics, the scan (with scan.index, scan.tokenize, scan.decode and
+    scan.gather inside it) and merge phases are timed, and each table's
+    scanned rows and bytes and the dump's size are counted.
+    """
+    print("Reading and processing SQL file...")
 
-    with open(sql_file, 'r', encoding='utf-8', errors='ignore') as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-
-            # Process wp_posts
-            if line.startswith('INSERT INTO `wp_posts` VALUES'):
-                print(f"Processing wp_posts at line {line_num}...")
-                records = parse_values_from_insert(line)
-                print(f"  Found {len(records)} records")
-
-                for record in records:
-                    if len(record) >= 23:
-                        # Field order based on CREATE TABLE:
-                        # 0:ID, 1:post_author, 2:post_date, 3:post_date_gmt, 4:post_content,
-                        # 5:post_title, 6:post_excerpt, 7:post_status, 8:comment_status,
-                        # 9:ping_status, 10:post_password, 11:post_name, 12:to_ping, 13:pinged,
-                        # 14:post_modified, 15:post_modified_gmt, 16:post_content_filtered,
-                        # 17:post_parent, 18:guid, 19:menu_order, 20:post_type, 21:post_mime_type, 22:comment_count
-                        post = {
-                            'ID': clean_text(record[0]),
-                            'post_author': clean_text(record[1]),
-                            'post_date': clean_text(record[2]),
-                            'post_date_gmt': clean_text(record[3]),
-                            'post_content': clean_text(record[4]),
-                            'post_title': clean_text(record[5]),
-                            'post_excerpt': clean_text(record[6]),
-                            'post_status': clean_text(record[7]),
-                            'comment_status': clean_text(record[8]),
-                            'ping_status': clean_text(record[9]),
-                            'post_password': clean_text(record[10]),
-                            'post_name': clean_text(record[11]),
-                            'to_ping': clean_text(record[12]),
-                            'pinged': clean_text(record[13]),
-                            'post_modified': clean_text(record[14]),
-                            'post_modified_gmt': clean_text(record[15]),
-                            'post_content_filtered': clean_text(record[16]),
-                            'post_parent': clean_text(record[17]),
-                            'guid': clean_text(record[18]),
-                            'menu_order': clean_text(record[19]),
-                            'post_type': clean_text(record[20]),
-                            'post_mime_type': clean_text(record[21]),
-                            'comment_count': clean_text(record[22]) if len(record) > 22 else '0',
-                            'meta': {}
-                        }
-                        posts.append(post)
-
-            # Process wp_postmeta
-            elif line.startswith('INSERT INTO `wp_postmeta` VALUES'):
-                print(f"Processing wp_postmeta at line {line_num}...")
-                records = parse_values_from_insert(line)
-                print(f"  Found {len(records)} metadata records")
-
-                for record in records:
-                    if len(record) >= 4:
-                        post_id = clean_text(record[1])
-                        meta_key = clean_text(record[2])
-                        meta_value = clean_text(record[3])
-
-                        postmeta[post_id][meta_key] = meta_value
+    compression = dump_compression(sql_file)
+    if compression:
+        print(f"Decompressing {compression} dump on the fly...")
+        if workers > 1:
+            print("  --workers needs an uncompressed dump, parsing serially")
+    if workers > 1 and not compression and os.path.getsize(sql_file):
+        with timed(metrics, 'scan'):
+            posts, postmeta = collect_posts_parallel(sql_file, workers, taxonomy, meta_filter, metrics)
+    else:
+        tables = POST_TABLES + TAXONOMY_TABLES if taxonomy is not None else POST_TABLES
+        columns = {}
+        tuples = iter_dump_tuples(sql_file, tables, columns, metrics)
+        with timed(metrics, 'scan'):
+            posts, postmeta = collect_posts(tuples, columns, taxonomy, meta_filter, metrics)
 
     print(f"\nTotal posts extracted: {len(posts)}")
     print(f"Total postmeta records: {sum(len(v) for v in postmeta.values())}")
 
     # Combine posts with their metadata
+    with timed(metrics, 'merge'):
+        attach_meta(posts, postmeta)
+
+        if taxonomy:
+            print(f"Total taxonomy terms: {len(taxonomy)} ({len(taxonomy.relationships)} relationships)")
+            taxonomy.attach(posts)
+
+    return posts
+
+# Tables copied into a SQLite store, with the columns of TABLE_COLUMNS
+STORE_TABLES = ('wp_posts', 'wp_postmeta', 'wp_terms', 'wp_term_taxonomy', 'wp_term_relationships')
+STORE_VERSION = 2
+STORE_BATCH = 5000
+_SQLITE_MAGIC = b'SQLite format 3\x00'
+# (name, table, columns) of the indexes built once the rows are in
+_STORE_INDEXES = (
+    ('wp_posts_type_status', 'wp_posts', 'post_type, post_status'),
+    ('wp_postmeta_post_id', 'wp_postmeta', 'post_id'),
+    ('wp_postmeta_meta_key', 'wp_postmeta', 'meta_key'),
+    ('wp_term_relationships_object_id', 'wp_term_relationships', 'object_id'),
+)
+# The store is built in a scratch file and renamed into place, so a load
+# that dies halfway loses nothing and needs neither a journal nor fsyncs
+_BULK_PRAGMAS = (
+    'journal_mode = OFF',
+    'synchronous = OFF',
+    'locking_mode = EXCLUSIVE',
+    'temp_store = MEMORY',
+    'cache_size = -65536',
+)
+
+def is_sqlite_store(path):
+    """Whether path is a SQLite file rather than a dump"""
+    with open(path, 'rb') as f:
+        return f.read(len(_SQLITE_MAGIC)) == _SQLITE_MAGIC
+
+def _store_source(sql_file):
+    stat = os.stat(sql_file)
+    return {'version': STORE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def store_is_current(db_file, sql_file):
+    """Whether db_file was loaded from sql_file as it is now"""
+    if not os.path.exists(db_file):
+        return False
+    try:
+        with closing(sqlite3.connect(db_file)) as conn:
+            source = dict(conn.execute('SELECT key, value FROM extract_source'))
+    except sqlite3.Error:
+        return False
+    return source == _store_source(sql_file)
+
+def load_sqlite(sql_file, db_file, batch_size=STORE_BATCH):
+    """
+    Bulk-load the STORE_TABLES rows of a dump into an indexed SQLite file.
+
+    Values are stored decoded, exactly as Post returns them, except that
+    meta_value keeps its HTML entities for decode_meta_value; wp_posts
+    keeps each row's digest for --incremental. Rows go in with executemany
+    in batches of batch_size inside one transaction, and the indexes are
+    built afterwards. Nothing is done if db_file already holds this dump,
+    going by its size and mtime.
+    """
+    if store_is_current(db_file, sql_file):
+        print(f"{db_file} is up to date with {sql_file}")
+        return
+
+    print(f"Loading {sql_file} into {db_file}...")
+    tmp_file = db_file + '.tmp'
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    conn = sqlite3.connect(tmp_file)
+    try:
+        for pragma in _BULK_PRAGMAS:
+            conn.execute(f'PRAGMA {pragma}')
+        statements = {}
+        for table in STORE_TABLES:
+            names = TABLE_COLUMNS[table] + (('row_digest',) if table == 'wp_posts' else ())
+            conn.execute(f'CREATE TABLE {table} ({", ".join(names)})')
+            statements[table] = f'INSERT INTO {table} VALUES ({", ".join("?" * len(names))})'
+        conn.execute('CREATE TABLE extract_source (key TEXT PRIMARY KEY, value)')
+
+        columns = {}
+        decoders = {}
+        pending = {table: [] for table in STORE_TABLES}
+        counts = dict.fromkeys(STORE_TABLES, 0)
+        table_seen = layout = decoder = None
+        for table, data, bounds in iter_dump_tuples(sql_file, STORE_TABLES, columns):
+            if table is not table_seen or columns.get(table) is not layout:
+                table_seen = table
+                layout = columns.get(table)
+                if table == 'wp_posts':
+                    decoder = row_decoder(table, layout)
+                else:
+                    decoder = decoders.get((table, layout))
+                    if decoder is None:
+                        decoder = RowDecoder(layout or TABLE_COLUMNS[table], TABLE_COLUMNS[table],
+                                             {'meta_value': decode_sql_field})
+                        decoders[table, layout] = decoder
+            if len(bounds) <= decoder.width:
+                continue
+
+            row = decoder(data, bounds)
+            if table == 'wp_posts':
+                row.append(row_digest(data, bounds))
+            rows = pending[table]
+            rows.append(row)
+            if len(rows) >= batch_size:
+                conn.executemany(statements[table], rows)
+                counts[table] += len(rows)
+                rows.clear()
+
+        for table, rows in pending.items():
+            conn.executemany(statements[table], rows)
+            counts[table] += len(rows)
+
+        print("Building indexes...")
+        for name, table, indexed in _STORE_INDEXES:
+            conn.execute(f'CREATE INDEX {name} ON {table} ({indexed})')
+        conn.executemany('INSERT INTO extract_source VALUES (?, ?)', _store_source(sql_file).items())
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_file)
+        raise
+    conn.close()
+    os.replace(tmp_file, db_file)
+
+    for table, count in counts.items():
+        print(f"  {table}: {count} rows")
+
+def _count_store_rows(rows, table, metrics):
+    """
+    Pass rows read from a store through, counting them and the UTF-8 bytes
+    of their values as table's rows and bytes, and the bytes as dump_bytes
+    """
+    count = nbytes = 0
+    for row in rows:
+        count += 1
+        nbytes += sum(len(value.encode('utf-8')) if isinstance(value, str) else len(str(value))
+                      for value in row if value is not None)
+        yield row
+    metrics.table(table, count, nbytes)
+    metrics.count('dump_bytes', nbytes)
+
+def read_store_posts(db_file, post_types=None, post_status=None, taxonomy=None, meta_filter=None,
+                     metrics=None):
+    """
+    Posts with their metadata from a SQLite store made by load_sqlite, in
+    dump order. post_types and post_status narrow the query, which then
+    goes through the (post_type, post_status) and post_id indexes. taxonomy,
+    meta_filter and metrics work as with process_sql_file; the store itself
+    keeps every meta row as a raw string, and the bytes counted are those of
+    the values read.
+    """
+    conditions = []
+    params = []
+    if post_types:
+        conditions.append(f'post_type IN ({", ".join("?" * len(post_types))})')
+        params.extend(post_types)
+    if post_status:
+        conditions.append('post_status = ?')
+        params.append(post_status)
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+
+    print(f"Reading posts from {db_file}...")
+    postmeta = defaultdict(dict)
+    with closing(sqlite3.connect(db_file)) as conn:
+        def execute(table, query, params=()):
+            rows = conn.execute(query, params)
+            return rows if metrics is None else _count_store_rows(rows, table, metrics)
+
+        rows = execute(
+            'wp_posts',
+            f'SELECT {", ".join(POST_COLUMNS)}, row_digest FROM wp_posts{where} ORDER BY rowid', params)
+        posts = [Post.from_values(list(row[:-1]), None, digest=row[-1]) for row in rows]
+
+        meta_where = f' WHERE post_id IN (SELECT ID FROM wp_posts{where})' if where else ''
+        rows = execute(
+            'wp_postmeta',
+            f'SELECT post_id, meta_key, meta_value FROM wp_postmeta{meta_where} ORDER BY rowid', params)
+        for post_id, meta_key, meta_value in rows:
+            if meta_filter is None:
+                if '&' in meta_value and meta_key not in SERIALIZED_META_KEYS:
+                    meta_value = html.unescape(meta_value)
+            elif meta_filter.keeps(meta_key):
+                meta_value = decode_meta_value(meta_value)
+            else:
+                continue
+            postmeta[post_id][meta_key] = meta_value
+
+        if taxonomy is not None:
+            for table in TAXONOMY_TABLES:
+                rows = execute(table, f'SELECT {", ".join(_WANTED_COLUMNS[table])} FROM {table} ORDER BY rowid')
+                for row in rows:
+                    taxonomy.add(table, row)
+
+    print(f"\nTotal posts extracted: {len(posts)}")
+    print(f"Total postmeta records: {sum(len(v) for v in postmeta.values())}")
+
     for post in posts:
         post_id = post['ID']
         if post_id in postmeta:
             post['meta'] = postmeta[post_id]
 
+    if taxonomy:
+        print(f"Total taxonomy terms: {len(taxonomy)} ({len(taxonomy.relationships)} relationships)")
+        taxonomy.attach(posts)
+
     return posts
 
-def main():
-    sql_file = "/Users/alvarogonzalez/Desktop/SSD Website Complete 10-12-25/Old SSD Website/wp-content/mysql.sql"
+class PostIndex:
+    """
+    Hash indexes over a list of posts, built once.
+
+    Every lookup returns a set of row numbers into posts, so category
+    queries are plain set unions and intersections, and rows() turns a
+    result back into posts in dump order. Titles and slugs are lowercased
+    once into a single corpus, on the first classify(), which runs a
+    KeywordMatcher over it row by row.
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.by_id = defaultdict(set)
+        self.by_type = defaultdict(set)
+        self.by_status = defaultdict(set)
+        self.by_term = defaultdict(set)
+        self.with_any_terms = set()
+        self._corpus = None
+        self._row_starts = None
+
+        for row, post in enumerate(posts):
+            self.by_id[post['ID']].add(row)
+            self.by_type[post['post_type']].add(row)
+            self.by_status[post['post_status']].add(row)
+            for key in POST_TAXONOMIES.values():
+                for term in post.get(key, ()):
+                    self.by_term[term['slug']].add(row)
+                    self.with_any_terms.add(row)
+
+    def rows(self, selection):
+        """Posts for a set of row numbers, in dump order"""
+        return [self.posts[row] for row in sorted(selection)]
+
+    def get(self, post_id):
+        """The last post with ID post_id, or None"""
+        rows = self.by_id.get(post_id)
+        return self.posts[max(rows)] if rows else None
+
+    def of_types(self, *post_types):
+        """Rows whose post_type is any of post_types"""
+        return set().union(*(self.by_type.get(t, ()) for t in post_types))
+
+    def with_terms(self, slugs):
+        """Rows in a category or tag with any of the given slugs"""
+        return set().union(*(self.by_term.get(slug, ()) for slug in slugs))
+
+    def classify(self, matcher, rows):
+        """
+        Run matcher once over the lowercased title and slug of each row,
+        returning {category: rows tagged with it}.
+        """
+        if self._corpus is None:
+            # \x01 separates title from slug and \x00 rows, so no keyword
+            # match can straddle two fields
+            texts = [post['post_title'].lower() + '\x01' + post['post_name'].lower()
+                     for post in self.posts]
+            self._corpus = '\x00'.join(texts)
+            self._row_starts = []
+            offset = 0
+            for text in texts:
+                self._row_starts.append(offset)
+                offset += len(text) + 1
+        tagged = defaultdict(set)
+        corpus = self._corpus
+        starts = self._row_starts
+        for row in rows:
+            end = starts[row + 1] - 1 if row + 1 < len(starts) else len(corpus)
+            for category in matcher.categories(corpus[starts[row]:end]):
+                tagged[category].add(row)
+        return tagged
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton that tags text with every category whose
+    keywords occur in it, in a single pass over the text.
+
+    Keywords added with whole_word only count when not touching a letter or
+    digit on either side, so 'np' matches "Jane Doe, NP" but not "snp-test".
+    Text and keywords are matched as given; lowercase both for
+    case-insensitive rules.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, keyword, category, whole_word=False):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(keyword), category, whole_word))
+        self._count += 1
 
-    posts = process_sql_file(sql_file)
+    def build(self):
+        """Compute failure links; call once after the last add()"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[next_state] = goto[f].get(char, 0)
+                out[next_state] = out[next_state] + out[fail[next_state]]
+        return self
+
+    def categories(self, text):
+        """Set of categories with at least one keyword match in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, category, whole_word in out[state]:
+                if category in found:
+                    continue
+                if whole_word:
+                    start = end - length
+                    if start > 0 and text[start - 1].isalnum():
+                        continue
+                    if end < len(text) and text[end].isalnum():
+                        continue
+                found.add(category)
+        return found
+
+REVISION_MODES = ('all', 'latest', 'none')
+
+def select_revisions(posts, mode='all'):
+    """
+    posts with their revisions kept ('all'), cut to the latest revision of
+    each parent ('latest', going by post_modified_gmt then ID) or dropped
+    ('none'). Only post_type, and for 'latest' the parent and dates of
+    revisions, are decoded.
+    """
+    if mode == 'all':
+        return posts
+    latest = {}
+    if mode == 'latest':
+        for row, post in enumerate(posts):
+            if post['post_type'] == 'revision':
+                key = (post['post_modified_gmt'], int(post['ID']) if post['ID'].isdigit() else 0)
+                best = latest.get(post['post_parent'])
+                if best is None or key > best[0]:
+                    latest[post['post_parent']] = (key, row)
+    keep = {row for _, row in latest.values()}
+    return [post for row, post in enumerate(posts) if row in keep or post['post_type'] != 'revision']
+
+DEFAULT_CATEGORIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extract_categories.json')
+
+def load_category_rules(path=DEFAULT_CATEGORIES):
+    """
+    Read category rules from JSON, keyed by category name in output order:
+    {"services": {"post_types": [...], "terms": [...], "keywords": [...],
+    "words": [...]}}. terms are category or tag slugs, matching posts filed
+    under them or any category nested below; keywords match anywhere in a
+    lowercased title or slug, words only as whole words.
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def build_matcher(rules):
+    """Compile every category's keywords into one KeywordMatcher"""
+    matcher = KeywordMatcher()
+    for category, rule in rules.items():
+        for keyword in rule.get('keywords', ()):
+            matcher.add(keyword.lower(), category)
+        for word in rule.get('words', ()):
+            matcher.add(word.lower(), category, whole_word=True)
+    return matcher.build()
+
+def classify_posts(posts, rules, taxonomy=None):
+    """
+    Sort posts into outputs. Returns {output name: set of row numbers} for
+    'pages', every category in rules, and 'menu_items'.
+
+    For a category with "terms", posts that have categories or tags are
+    placed by taxonomy membership alone; only posts without any (such as
+    pages) fall back to keywords. taxonomy supplies the category tree so
+    nested categories count too.
+    """
+    index = PostIndex(posts)
+    published = index.by_status.get('publish', set())
 
     # Filter by post type and status
-    pages = [p for p in posts if p['post_type'] == 'page' and p['post_status'] == 'publish']
+    selections = {'pages': index.by_type.get('page', set()) & published}
 
-    # Find services - could be pages, custom post types, or layouts
-    services = []
-    locations = []
-    providers = []
+    # Find services, locations, providers... - could be pages, custom post
+    # types, or layouts, so match on post type, taxonomy or keywords. Once
+    # every category has terms, filed posts need no keyword scan at all
+    matcher = build_matcher(rules)
+    scanned = published
+    if all('terms' in rule for rule in rules.values()):
+        scanned = published - index.with_any_terms
+    tagged = index.classify(matcher, scanned) if matcher else {}
+    for category, rule in rules.items():
+        matched = tagged.get(category, set())
+        if 'terms' in rule:
+            slugs = taxonomy.descendants(rule['terms']) if taxonomy else rule['terms']
+            matched = (matched - index.with_any_terms) | index.with_terms(slugs)
+        selections[category] = published & (matched | index.of_types(*rule.get('post_types', ())))
 
-    for post in posts:
-        if post['post_status'] != 'publish':
+    # Get menu items
+    selections['menu_items'] = index.of_types('nav_menu_item')
+    return selections
+
+def label_posts(posts, rules, taxonomy=None):
+    """
+    Classifier stage: yield (post, names) for every post in order, names
+    being the classify_posts outputs that hold it. A category keeps only
+    the first post with a given ID, as plan_outputs does.
+    """
+    posts = list(posts)
+    ids = [post['ID'] for post in posts]
+    labels = defaultdict(list)
+    for name, rows in classify_posts(posts, rules, taxonomy).items():
+        for row in dedupe_rows(sorted(rows), ids) if name in rules else rows:
+            labels[row].append(name)
+    for row, post in enumerate(posts):
+        yield post, labels.get(row, [])
+
+MENU_TREE_FILE = 'menu-tree.json'
+# URL base of taxonomy archives, by taxonomy
+_TAXONOMY_BASES = {'category': 'category', 'post_tag': 'tag'}
+
+def _menu_order(post):
+    try:
+        return int(post['menu_order'])
+    except ValueError:
+        return 0
+
+def post_path(post, index):
+    """
+    Site-relative path of a post: its slug, under its parents' for pages.
+    index is a PostIndex the parents are looked up in.
+    """
+    slugs = [post['post_name']]
+    if post['post_type'] == 'page':
+        seen = {post['ID']}
+        parent = index.get(post['post_parent'])
+        while parent is not None and parent['ID'] not in seen:
+            seen.add(parent['ID'])
+            slugs.append(parent['post_name'])
+            parent = index.get(parent['post_parent'])
+    return '/' + '/'.join(reversed(slugs))
+
+def menu_link(item, index, terms):
+    """
+    A nav_menu_item resolved to a compact link: its title (the target's if
+    left empty), site-relative url and slug, and what it points at.
+    """
+    meta = item.get('meta') or {}
+    kind = meta.get('_menu_item_type', 'custom')
+    object_name = meta.get('_menu_item_object', '')
+    object_id = meta.get('_menu_item_object_id', '')
+    title = item['post_title']
+    url = meta.get('_menu_item_url', '')
+    slug = ''
+
+    if kind == 'post_type':
+        target = index.get(object_id)
+        if target is not None:
+            title = title or target['post_title']
+            url = post_path(target, index)
+            slug = target['post_name']
+    elif kind == 'taxonomy':
+        term = terms.get(object_id)
+        if term is not None:
+            title = title or term['name']
+            slug = term['slug']
+            url = f"/{_TAXONOMY_BASES.get(object_name, object_name)}/{slug}"
+    elif kind == 'post_type_archive':
+        slug = object_name
+        url = f'/{object_name}'
+
+    return {
+        'id': item['ID'],
+        'title': title,
+        'url': url,
+        'slug': slug,
+        'type': kind,
+        'object': object_name,
+        'object_id': object_id,
+        'target': meta.get('_menu_item_target', ''),
+        'children': [],
+    }
+
+def _parent_loops(nodes, item_id):
+    """Whether following an item's parents from nodes leads back to it"""
+    seen = set()
+    parent_id = nodes[item_id][1]
+    while parent_id in nodes and parent_id not in seen:
+        if parent_id == item_id:
+            return True
+        seen.add(parent_id)
+        parent_id = nodes[parent_id][1]
+    return False
+
+def build_menus(posts, taxonomy=None, index=None):
+    """
+    Nested tree of each nav menu, from the published nav_menu_item posts and
+    their _menu_item_* meta. index is a PostIndex over posts, built here if
+    not given.
+
+    Items and link targets are looked up in the PostIndex and menus in a
+    dict, so the build is linear in the number of posts. Every node is
+    a menu_link with its children in menu_order. Menus are the nav_menu terms
+    items are filed under; items outside any menu, as in a dump without
+    taxonomy tables, go into one unnamed menu. Items whose parent is missing
+    from their menu, or whose parents loop back to them, become top-level.
+    """
+    if index is None:
+        index = PostIndex(posts)
+    items = index.rows(index.of_types('nav_menu_item') & index.by_status.get('publish', set()))
+    items.sort(key=_menu_order)
+
+    post_terms = taxonomy.post_terms() if taxonomy else {}
+    terms = taxonomy.terms if taxonomy else {}
+
+    menus = {}
+    nodes = {}
+    for item in items:
+        menu_terms = post_terms.get(item['ID'], {}).get('nav_menu')
+        menu = menu_terms[0] if menu_terms else {'term_id': '', 'name': '', 'slug': ''}
+        if menu['term_id'] not in menus:
+            menus[menu['term_id']] = {'menu': menu['name'], 'slug': menu['slug'], 'items': []}
+        meta = item.get('meta') or {}
+        nodes[item['ID']] = (menu['term_id'], meta.get('_menu_item_menu_item_parent', '0'),
+                             menu_link(item, index, terms))
+
+    # Nodes are in menu_order, so appending keeps every level ordered
+    for item_id, (menu_id, parent_id, node) in nodes.items():
+        parent = nodes.get(parent_id)
+        if parent is not None and parent[0] == menu_id and not _parent_loops(nodes, item_id):
+            parent[2]['children'].append(node)
+        else:
+            menus[menu_id]['items'].append(node)
+
+    return list(menus.values())
+
+# Divi and its add-on packs; other bracketed text is left as text
+SHORTCODE_PREFIXES = ('et_pb_', 'dsm_', 'dica_')
+
+_SHORTCODE_RE = re.compile(
+    r'\[(/?)((?:%s)[\w-]*)((?:"[^"]*"|\'[^\']*\'|[^\]"\'])*)\]'
+    % '|'.join(re.escape(prefix) for prefix in SHORTCODE_PREFIXES))
+_SHORTCODE_ATTR_RE = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\']+))')
+
+class Shortcode:
+    """
+    A shortcode in parsed content; children holds text and nested
+    shortcodes. The attribute text is kept as written and only parsed into
+    the attrs dict when first read.
+    """
+
+    __slots__ = ('tag', 'raw_attrs', '_attrs', 'children')
+
+    def __init__(self, tag, raw_attrs='', children=None):
+        self.tag = tag
+        self.raw_attrs = raw_attrs
+        self._attrs = None
+        self.children = children if children is not None else []
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = parse_shortcode_attrs(self.raw_attrs)
+        return self._attrs
+
+    def __repr__(self):
+        return f"Shortcode({self.tag!r}, {self.raw_attrs!r}, {self.children!r})"
+
+def parse_shortcode_attrs(text):
+    """Named attributes of a shortcode tag; positional ones are dropped"""
+    return {m.group(1).lower(): next(v for v in m.group(2, 3, 4) if v is not None)
+            for m in _SHORTCODE_ATTR_RE.finditer(text)}
+
+def parse_shortcodes(content):
+    """
+    Parse content into a list of text strings and Shortcode nodes in one
+    pass. As in WordPress, a tag without a matching closing tag is
+    self-closing: what follows it belongs to its parent. Stray closing
+    tags are dropped.
+    """
+    root = []
+    stack = [Shortcode(None, '', root)]
+
+    def close_top():
+        # An unclosed tag's "children" were really its siblings
+        node = stack.pop()
+        stack[-1].children.extend(node.children)
+        node.children = []
+
+    # split yields text, then (closing slash, tag, attributes, text) per tag
+    tokens = _SHORTCODE_RE.split(content)
+    if tokens[0]:
+        root.append(tokens[0])
+    for i in range(1, len(tokens), 4):
+        slash, tag, attrs, text = tokens[i:i + 4]
+        if slash:
+            depth = len(stack) - 1
+            while depth and stack[depth].tag != tag:
+                depth -= 1
+            if depth:
+                while len(stack) > depth + 1:
+                    close_top()
+                stack.pop()
+        else:
+            node = Shortcode(tag, attrs)
+            stack[-1].children.append(node)
+            if not attrs.rstrip().endswith('/'):
+                stack.append(node)
+        if text:
+            stack[-1].children.append(text)
+    while len(stack) > 1:
+        close_top()
+    return root
+
+# Tags kept by sanitize_html with the attributes each may keep
+_HTML_ALLOWED = {
+    'a': ('href', 'title', 'target', 'rel'),
+    'img': ('src', 'alt', 'title', 'width', 'height'),
+    **{tag: () for tag in (
+        'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b', 'em', 'i', 'u', 's',
+        'sub', 'sup', 'small', 'blockquote', 'pre', 'code', 'ul', 'ol', 'li', 'dl', 'dt', 'dd',
+        'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'figure', 'figcaption')},
+}
+_HTML_VOID = frozenset(('br', 'hr', 'img'))
+# Tags dropped together with everything inside them
+_HTML_DROPPED = frozenset((
+    'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'svg', 'math',
+    'form', 'button', 'select', 'textarea', 'head', 'title'))
+_HTML_URL_ATTRS = frozenset(('href', 'src'))
+
+_HTML_TAG_RE = re.compile(
+    r'<!--.*?(?:-->|$)|<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:"[^"]*"|\'[^\']*\'|[^>"\'])*)>', re.DOTALL)
+_HTML_ATTR_RE = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?')
+# Absolute http(s)/mailto/tel URLs, or relative ones (no scheme before the first /?#)
+_SAFE_URL_RE = re.compile(r'(?:https?:|mailto:|tel:|[^:/?#]*(?:[/?#]|$))', re.IGNORECASE)
+_IMAGE_URL_RE = re.compile(r'(?:https?://|/)\S+?\.(?:jpe?g|png|gif|webp|avif|svg)(?:[?#]\S*)?', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+def sanitize_html(markup, images=None):
+    """
+    markup reduced to an allowlist of formatting tags and attributes, with
+    script-like elements dropped whole, unsafe URLs removed, tags balanced
+    and text escaped. The src of every kept <img> is appended to images if
+    given. A script-like element that is never closed loses just its tag,
+    not the rest of the markup.
+    """
+    out = []
+    open_tags = []
+    skip_to = None
+    last_close = None
+    # split yields text, then (closing slash, tag, attributes, text) per tag;
+    # comments come back as a tag of None
+    tokens = _HTML_TAG_RE.split(markup)
+    if tokens[0]:
+        out.append(html.escape(tokens[0], quote=False))
+    for i in range(1, len(tokens), 4):
+        slash, tag, attrs, text = tokens[i:i + 4]
+        if tag is not None:
+            tag = tag.lower()
+        if skip_to is not None:
+            if slash and tag == skip_to:
+                skip_to = None
+                if text:
+                    out.append(html.escape(text, quote=False))
+            continue
+        if tag is None:
+            pass
+        elif slash:
+            if tag in open_tags:
+                while True:
+                    top = open_tags.pop()
+                    out.append(f'</{top}>')
+                    if top == tag:
+                        break
+        elif tag in _HTML_DROPPED:
+            if last_close is None:
+                # Token index of the last closing tag of each name
+                last_close = {tokens[j + 1].lower(): j for j in range(1, len(tokens), 4)
+                              if tokens[j]}
+            if not attrs.rstrip().endswith('/') and last_close.get(tag, 0) > i:
+                skip_to = tag
+                continue
+        elif tag in _HTML_ALLOWED:
+            allowed = _HTML_ALLOWED[tag]
+            kept = []
+            for attr in _HTML_ATTR_RE.finditer(attrs) if allowed else ():
+                name = attr.group(1).lower()
+                if name not in allowed:
+                    continue
+                value = html.unescape(next((v for v in attr.group(2, 3, 4) if v is not None), ''))
+                if name in _HTML_URL_ATTRS:
+                    value = value.strip()
+                    if not _SAFE_URL_RE.match(value):
+                        continue
+                    if tag == 'img' and images is not None and value:
+                        images.append(value)
+                kept.append(f' {name}="{html.escape(value)}"')
+            out.append(f"<{tag}{''.join(kept)}>")
+            if tag not in _HTML_VOID:
+                open_tags.append(tag)
+        if text:
+            out.append(html.escape(text, quote=False))
+    out.extend(f'</{tag}>' for tag in reversed(open_tags))
+    return ''.join(out)
+
+def _flatten_shortcodes(nodes, parts, images, backgrounds):
+    """
+    Collect the text of nodes into parts, and image URLs in their src
+    attributes (before_src and the like included) into images and in any
+    other attribute into backgrounds
+    """
+    for node in nodes:
+        if isinstance(node, str):
+            parts.append(node)
             continue
+        if _IMAGE_URL_RE.search(node.raw_attrs):
+            for name, value in node.attrs.items():
+                if _IMAGE_URL_RE.fullmatch(value):
+                    (images if name == 'src' or name.endswith('_src') else backgrounds).append(value)
+        # Modules are blocks: keep their text apart
+        parts.append('\n')
+        _flatten_shortcodes(node.children, parts, images, backgrounds)
+        parts.append('\n')
 
-        post_type = post['post_type']
-        title_lower = post['post_title'].lower()
-        name_lower = post['post_name'].lower()
-        content_lower = post['post_content'][:500].lower() if post['post_content'] else ""
-
-        # Identify services
-        service_keywords = ['botox', 'filler', 'mohs', 'surgery', 'skin cancer', 'acne', 'cosmetic',
-                           'laser', 'treatment', 'procedure', 'peel', 'microneedling', 'rejuvenation']
-        if (any(kw in title_lower for kw in service_keywords) or
-            any(kw in name_lower for kw in service_keywords) or
-            post_type in ('service', 'services')):
-            services.append(post)
-
-        # Identify locations
-        location_keywords = ['trussville', 'pell city', 'gadsden', 'location', 'office', 'clinic']
-        if (any(kw in title_lower for kw in location_keywords) or
-            any(kw in name_lower for kw in location_keywords) or
-            post_type in ('location', 'locations')):
-            locations.append(post)
-
-        # Identify providers/doctors
-        provider_keywords = ['dr.', 'doctor', 'physician', 'provider', 'dermatologist', 'pa-c', 'np']
-        if (any(kw in title_lower for kw in provider_keywords) or
-            any(kw in name_lower for kw in provider_keywords) or
-            post_type in ('provider', 'providers', 'doctor', 'team')):
-            providers.append(post)
+# Bump when render_content's output or the outputs carrying it change, so
+# incremental runs redo every post
+CONTENT_FIELDS_VERSION = 3
 
-    # Get menu items
-    menu_items = [p for p in posts if p['post_type'] == 'nav_menu_item']
-
-    # Remove duplicates by ID
-    def dedupe_by_id(items):
-        seen = set()
-        result = []
-        for item in items:
-            if item['ID'] not in seen:
-                seen.add(item['ID'])
-                result.append(item)
-        return result
-
-    services = dedupe_by_id(services)
-    locations = dedupe_by_id(locations)
-    providers = dedupe_by_id(providers)
+def render_content(content):
+    """
+    post_content parsed once into the fields builds used to regex out of
+    it: content_text (plain text), content_images (deduplicated image URLs:
+    shortcode src attributes, then <img> tags, then backgrounds and other
+    shortcode attributes) and content_html (the markup without shortcodes,
+    sanitized).
+    """
+    parts = []
+    images = []
+    backgrounds = []
+    _flatten_shortcodes(parse_shortcodes(content), parts, images, backgrounds)
+    markup = sanitize_html(''.join(parts), images)
+    images.extend(backgrounds)
+    text = html.unescape(_HTML_TAG_RE.sub(' ', markup))
+    return {
+        'content_text': _WHITESPACE_RE.sub(' ', text).strip(),
+        'content_images': list(dict.fromkeys(images)),
+        'content_html': _BLANK_LINES_RE.sub('\n', markup).strip(),
+    }
 
-    print(f"\n=== EXTRACTION SUMMARY ===")
-    print(f"Pages: {len(pages)}")
-    print(f"Services: {len(services)}")
-    print(f"Locations: {len(locations)}")
-    print(f"Providers: {len(providers)}")
-    print(f"Menu items: {len(menu_items)}")
+# Raw post_content bytes shipped to a worker at a time by render_parallel
+RENDER_CHUNK_BYTES = 1024 * 1024
 
-    # Create output directory
-    output_dir = "/Users/alvarogonzalez/Desktop/SSD Website Complete 10-12-25/ssd-nextjs/extracted-content"
-    os.makedirs(output_dir, exist_ok=True)
+def _render_batch(batch):
+    """Worker: decode and render a batch of post bodies, raw bytes or already decoded"""
+    results = []
+    for raw in batch:
+        content = decode_field(raw) if isinstance(raw, bytes) else raw
+        results.append((content, render_content(content)))
+    return results
 
-    # Save extracted content
-    print("\nSaving extracted content...")
+def _render_batches(bodies, chunk_bytes):
+    """Group bodies into lists of about chunk_bytes, a bigger body going alone"""
+    batch = []
+    size = 0
+    for body in bodies:
+        if batch and size + len(body) > chunk_bytes:
+            yield batch
+            batch = []
+            size = 0
+        batch.append(body)
+        size += len(body)
+    if batch:
+        yield batch
+
+def render_parallel(bodies, workers, chunk_bytes=RENDER_CHUNK_BYTES):
+    """
+    Yield (post_content, render_content fields) for each body in order,
+    decoding and rendering them in a pool of workers processes. A body is
+    the raw post_content bytes from Post.raw or an already decoded string.
+
+    Bodies go out in batches of about chunk_bytes rather than a fixed number
+    of rows, so one huge page never shares a worker's batch with many
+    others, and only a few batches per worker are in flight at once.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in _render_batches(bodies, chunk_bytes):
+            pending.append(pool.submit(_render_batch, batch))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
 
-    with open(f"{output_dir}/services-complete.json", 'w', encoding='utf-8') as f:
-        json.dump(services, f, indent=2, ensure_ascii=False)
+MEDIA_MANIFEST_FILE = 'media-manifest.json'
 
-    with open(f"{output_dir}/locations-complete.json", 'w', encoding='utf-8') as f:
-        json.dump(locations, f, indent=2, ensure_ascii=False)
+_UPLOADS_MARKER = '/wp-content/uploads/'
+# What build_media_manifest reports for an image no attachment holds
+_MEDIA_FIELDS = ('attachment_id', 'file', 'size', 'width', 'height', 'mime_type', 'alt')
 
-    with open(f"{output_dir}/providers-complete.json", 'w', encoding='utf-8') as f:
-        json.dump(providers, f, indent=2, ensure_ascii=False)
+def uploads_path(url):
+    """Path of url under wp-content/uploads, or None if it isn't an upload"""
+    start = url.find(_UPLOADS_MARKER)
+    if start < 0:
+        return None
+    path = url[start + len(_UPLOADS_MARKER):].split('?', 1)[0].split('#', 1)[0]
+    return unquote(path) or None
 
-    with open(f"{output_dir}/pages-content.json", 'w', encoding='utf-8') as f:
-        json.dump(pages, f, indent=2, ensure_ascii=False)
+def _dimension(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
-    with open(f"{output_dir}/menu-structure.json", 'w', encoding='utf-8') as f:
-        json.dump(menu_items, f, indent=2, ensure_ascii=False)
+class AttachmentIndex:
+    """
+    Every file of every attachment under wp-content/uploads: the attached
+    file, each generated size and the original of a -scaled upload, with
+    its dimensions. Built from post_type 'attachment' rows and their
+    _wp_attached_file and _wp_attachment_metadata meta.
+
+    Files are keyed by their path under uploads, so a URL resolves whatever
+    host or scheme it was written with. Lookups are cached by URL.
+    """
+
+    def __init__(self, posts=()):
+        self.by_id = {}
+        self.files = {}
+        self._resolved = {}
+        for post in posts:
+            self.add(post)
+
+    def add(self, post):
+        """Index post if it is an attachment"""
+        if post['post_type'] != 'attachment':
+            return
+        meta = post.get('meta') or {}
+        attached = meta.get('_wp_attached_file') or uploads_path(post['guid'])
+        if not attached:
+            return
+        metadata = meta.get('_wp_attachment_metadata')
+        if isinstance(metadata, str):
+            # Still raw when meta wasn't filtered
+            metadata = decode_meta_value(metadata)
+        if not isinstance(metadata, dict):
+            metadata = {}
+        attachment_id = post['ID']
+        mime_type = post['post_mime_type'] or None
+        alt = meta.get('_wp_attachment_image_alt') or None
+        directory = attached.rpartition('/')[0]
+        self._resolved.clear()
+
+        def add_file(path, size, info):
+            self.files.setdefault(path, {
+                'attachment_id': attachment_id,
+                'file': path,
+                'size': size,
+                'width': _dimension(info.get('width')),
+                'height': _dimension(info.get('height')),
+                'mime_type': info.get('mime-type') or mime_type,
+                'alt': alt,
+            })
+
+        add_file(attached, 'full', metadata)
+        sizes = metadata.get('sizes')
+        for size, info in sizes.items() if isinstance(sizes, dict) else ():
+            if isinstance(info, dict) and info.get('file'):
+                add_file(f"{directory}/{info['file']}" if directory else info['file'], size, info)
+        original = metadata.get('original_image')
+        if isinstance(original, str) and original:
+            add_file(f"{directory}/{original}" if directory else original, 'original', {})
+        guid_path = uploads_path(post['guid'])
+        if guid_path:
+            self.files.setdefault(guid_path, self.files[attached])
+            self.by_id[attachment_id] = post['guid']
+        else:
+            self.by_id[attachment_id] = _UPLOADS_MARKER + attached
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def url(self, attachment_id):
+        """URL of an attachment's file, or None if attachment_id isn't one"""
+        return self.by_id.get(attachment_id)
+
+    def resolve(self, url):
+        """The indexed file url points to, or None"""
+        try:
+            return self._resolved[url]
+        except KeyError:
+            path = uploads_path(url)
+            media = self._resolved[url] = self.files.get(path) if path else None
+            return media
+
+    def resolve_many(self, urls):
+        """{url: file or None} for urls, each distinct one looked up once"""
+        return {url: self.resolve(url) for url in dict.fromkeys(urls)}
+
+def build_media_manifest(entries, rows, attachments, images=None):
+    """
+    The images shown by entries[row] for each of rows, deduplicated: their
+    content_images and featured image (_thumbnail_id), resolved through
+    attachments in one batch. Each item has the URL first seen, the
+    attachment file with its size name, width, height, mime type and alt
+    text (None for images outside the media library), and the IDs of the
+    posts that show it.
+
+    images maps rows to content_images already computed by write_outputs;
+    entries reused from a previous run carry theirs.
+    """
+    references = defaultdict(list)
+    for row in rows:
+        entry = entries[row]
+        urls = images.get(row) if images else None
+        if urls is None:
+            urls = (entry['content_images'] if 'content_images' in entry
+                    else render_content(entry['post_content'])['content_images'])
+        featured = attachments.url((entry.get('meta') or {}).get('_thumbnail_id'))
+        if featured is not None:
+            urls = [featured, *urls]
+        for url in urls:
+            post_ids = references[url]
+            if entry['ID'] not in post_ids:
+                post_ids.append(entry['ID'])
 
-    # Save all posts for reference
-    with open(f"{output_dir}/all-posts.json", 'w', encoding='utf-8') as f:
-        json.dump(posts, f, indent=2, ensure_ascii=False)
+    manifest = {}
+    for url, media in attachments.resolve_many(references).items():
+        key = media['file'] if media else url
+        item = manifest.get(key)
+        if item is None:
+            item = manifest[key] = {'url': url, **(media or dict.fromkeys(_MEDIA_FIELDS)), 'posts': []}
+        item['posts'].extend(post_id for post_id in references[url] if post_id not in item['posts'])
+    return list(manifest.values())
+
+SEARCH_INDEX_DIR = 'search-index'
+SEARCH_INDEX_VERSION = 1
+# Serialized size a shard is cut at, and its file name
+SEARCH_SHARD_BYTES = 64 * 1024
+_SEARCH_SHARD_FILE = 'shard-{:03d}.json'
+# Term frequency multiplier of each field, and BM25's k1 and b
+SEARCH_FIELDS = {'post_title': 3, 'post_excerpt': 2, 'content_text': 1}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or
+our so than that the their then there these they this to was we were will
+with you your
+""".split())
+# Suffixes stem strips, first match wins; a stem keeps at least 3 letters
+_SUFFIXES = (
+    ('sses', 'ss'), ('ies', 'y'), ('ss', 'ss'), ('ness', ''), ('ments', ''), ('ment', ''),
+    ('ings', ''), ('ing', ''), ('edly', ''), ('ed', ''), ('ly', ''), ('es', ''), ('s', ''),
+)
+# What a word can end in past its stem: a suffix, maybe after an 'e', or the 'e'
+_STEM_ENDINGS = ('', 'e') + tuple(end for suffix, _ in _SUFFIXES for end in (suffix, 'e' + suffix))
+
+def stem(word):
+    """
+    Light English stemmer: strip the first matching _SUFFIXES entry, then a
+    final 'e', so 'services', 'service' and 'serviced' all become 'servic'.
+    Deliberately simple, so a frontend can port it in a few lines.
+    """
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    return word
+
+def stems_begun_by(prefix):
+    """
+    Stems that words starting with prefix can have but that don't start
+    with prefix themselves: 'treatm' may end up 'treatment', whose stem is
+    'treat'. Found by completing each head of prefix with every ending
+    stem strips, so the set is small and exact for those completions.
+    """
+    found = set()
+    for cut in range(3, len(prefix) + 1):
+        head, rest = prefix[:cut], prefix[cut:]
+        for ending in _STEM_ENDINGS:
+            if ending.startswith(rest):
+                term = stem(head + ending)
+                if not term.startswith(prefix):
+                    found.add(term)
+    return found
+
+class SearchIndex:
+    """
+    Inverted index with BM25 weights over posts' title, excerpt and plain
+    text, weighted per SEARCH_FIELDS.
+
+    Every (term, post) weight is final once all posts are in, so a query's
+    score is just the sum of its terms' weights. write() stores the terms in
+    sorted order, cut into shards of about SEARCH_SHARD_BYTES, plus a
+    manifest of the posts and the first term of each shard; a client finds
+    a term's shard by binary search on those and fetches only that file.
+    """
+
+    # Distinct words whose stems are remembered
+    MAX_CACHED = 100000
+
+    def __init__(self):
+        self.docs = []
+        self.lengths = []
+        self.postings = defaultdict(dict)
+        self._stems = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, post, text):
+        """Index a post (or entry) with its plain text, e.g. content_text"""
+        doc = len(self.docs)
+        self.docs.append({'ID': post['ID'], 'title': post['post_title'],
+                          'slug': post['post_name'], 'type': post['post_type']})
+        counts = defaultdict(int)
+        stems = self._stems
+        for field, weight in SEARCH_FIELDS.items():
+            value = text if field == 'content_text' else post.get(field) or ''
+            words = defaultdict(int)
+            for word in _TOKEN_RE.findall(value.lower()):
+                words[word] += 1
+            # Stem each distinct word once, and once per index where possible
+            for word, n in words.items():
+                if word in _STOPWORDS:
+                    continue
+                term = stems.get(word)
+                if term is None:
+                    term = stem(word)
+                    if len(stems) < self.MAX_CACHED:
+                        stems[word] = term
+                counts[term] += n * weight
+        for term, tf in counts.items():
+            self.postings[term][doc] = tf
+        self.lengths.append(sum(counts.values()))
+
+    def weights(self):
+        """(term, [(doc, weight), ...]) in term order, weights being BM25"""
+        n = len(self.docs)
+        avgdl = sum(self.lengths) / n if n else 0
+        for term in sorted(self.postings):
+            docs = self.postings[term]
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            yield term, [(doc, idf * tf * (BM25_K1 + 1)
+                          / (tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / avgdl)))
+                         for doc, tf in sorted(docs.items())]
+
+    def write(self, directory, shard_bytes=SEARCH_SHARD_BYTES):
+        """
+        Write manifest.json and the shards into directory, replacing any
+        earlier index. A shard maps each of its terms to a flat list of
+        doc-number gaps and weights: [gap, weight, gap, weight, ...].
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith('shard-'):
+                os.remove(os.path.join(directory, name))
+
+        firsts = []
+        shard = {}
+        size = 0
+
+        def flush():
+            with open(os.path.join(directory, _SEARCH_SHARD_FILE.format(len(firsts))), 'w',
+                      encoding='utf-8') as f:
+                json.dump(shard, f, ensure_ascii=False, separators=(',', ':'))
+            firsts.append(next(iter(shard)))
+
+        for term, weighted in self.weights():
+            flat = []
+            previous = 0
+            for doc, weight in weighted:
+                flat += (doc - previous, round(weight, 3))
+                previous = doc
+            encoded = json.dumps(flat, separators=(',', ':'))
+            if shard and size + len(term) + len(encoded) > shard_bytes:
+                flush()
+                shard = {}
+                size = 0
+            shard[term] = flat
+            size += len(term) + len(encoded) + 4
+        if shard:
+            flush()
+
+        manifest = {
+            'version': SEARCH_INDEX_VERSION,
+            'fields': SEARCH_FIELDS,
+            'docs': self.docs,
+            'shards': firsts,
+            'shard_file': _SEARCH_SHARD_FILE,
+        }
+        with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        return len(firsts)
+
+class SearchReader:
+    """
+    Query API over a directory written by SearchIndex.write, loading shards
+    only when a query needs them, as the frontend would:
+
+        SearchReader('extracted-content/search-index').search('mohs surgery')
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != SEARCH_INDEX_VERSION:
+            raise ValueError(f"{directory}: unsupported search index version {manifest.get('version')}")
+        self.docs = manifest['docs']
+        self.firsts = manifest['shards']
+        self.shard_file = manifest['shard_file']
+        self._shards = {}
+
+    def shard(self, number):
+        """Terms of one shard, sorted, read on first use"""
+        terms = self._shards.get(number)
+        if terms is None:
+            path = os.path.join(self.directory, self.shard_file.format(number))
+            with open(path, encoding='utf-8') as f:
+                terms = self._shards[number] = json.load(f)
+        return terms
+
+    def postings(self, term):
+        """{doc: weight} for one stemmed term"""
+        number = bisect_right(self.firsts, term) - 1
+        if number < 0:
+            return {}
+        return self._decode(self.shard(number).get(term, ()))
+
+    def prefix_postings(self, prefix):
+        """
+        {doc: weight} summed over every term a word starting with prefix can
+        stem to: the terms that start with the unstemmed prefix, plus
+        stems_begun_by(prefix), each counted once.
+        """
+        found = defaultdict(float)
+        for term in stems_begun_by(prefix):
+            for doc, weight in self.postings(term).items():
+                found[doc] += weight
+        number = max(bisect_right(self.firsts, prefix) - 1, 0)
+        while number < len(self.firsts):
+            for term, flat in self.shard(number).items():
+                if term.startswith(prefix):
+                    for doc, weight in self._decode(flat).items():
+                        found[doc] += weight
+                elif term > prefix:
+                    return found
+            number += 1
+        return found
+
+    @staticmethod
+    def _decode(flat):
+        docs = {}
+        doc = 0
+        for i in range(0, len(flat), 2):
+            doc += flat[i]
+            docs[doc] = flat[i + 1]
+        return docs
+
+    def search(self, query, limit=10, prefix=False):
+        """
+        The best matching posts for query, as their manifest entries with a
+        'score' added, best first. Scores sum over the query's terms; with
+        prefix, the last word is taken as unfinished and left unstemmed, and
+        matches whatever the words it begins stem to, for search-as-you-type.
+        """
+        words = _TOKEN_RE.findall(query.lower())
+        partial = words.pop() if prefix and words else None
+        hits = [self.postings(stem(word)) for word in words if word not in _STOPWORDS]
+        if partial is not None:
+            hits.append(self.prefix_postings(partial))
+        if not hits:
+            return []
+        scores = defaultdict(float)
+        for postings in hits:
+            for doc, weight in postings.items():
+                scores[doc] += weight
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{**self.docs[doc], 'score': round(score, 3)} for doc, score in best]
+
+def build_search_index(entries, rows, texts=None):
+    """
+    SearchIndex over entries[row] for each of rows. texts maps rows to the
+    content_text write_outputs already computed; entries reused from a
+    previous run carry theirs, and any other row is rendered here.
+    """
+    index = SearchIndex()
+    for row in rows:
+        entry = entries[row]
+        text = texts.get(row) if texts else None
+        if text is None:
+            text = (entry['content_text'] if 'content_text' in entry
+                    else render_content(entry['post_content'])['content_text'])
+        index.add(entry, text)
+    return index
+
+def output_files(rules, fmt='pretty'):
+    """Output name -> file name in the output directory"""
+    ext = '.ndjson' if fmt == 'ndjson' else '.json'
+    files = {category: f"{category}-complete{ext}" for category in rules}
+    files['pages'] = f'pages-content{ext}'
+    files['menu_items'] = f'menu-structure{ext}'
+    files['all_posts'] = f'all-posts{ext}'
+    return files
+
+OUTPUT_FORMATS = ('pretty', 'compact', 'ndjson')
+
+def encode_element(item, fmt):
+    """Encode one array element for JsonArrayWriter.write_encoded"""
+    if fmt == 'pretty':
+        # JSON strings never hold raw newlines, so indenting every line
+        # nests the element one level down exactly as json.dump would
+        return json.dumps(item, indent=2, ensure_ascii=False, default=json_default).replace('\n', '\n  ')
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array to a file one element at a time.
+
+    'pretty' output is byte for byte what json.dump(items, f, indent=2)
+    writes, 'compact' drops the whitespace, and 'ndjson' writes one element
+    per line with no enclosing array. Elements are encoded by the caller
+    with encode_element, so one encoding can go to several files.
+    """
+
+    def __init__(self, path, fmt='pretty'):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.fmt = fmt
+        self.count = 0
+
+    def write_encoded(self, text):
+        if self.fmt == 'ndjson':
+            self.f.write(text + '\n')
+        elif self.fmt == 'pretty':
+            self.f.write(('[\n  ' if not self.count else ',\n  ') + text)
+        else:
+            self.f.write(('[' if not self.count else ',') + text)
+        self.count += 1
+
+    def write(self, item):
+        self.write_encoded(encode_element(item, self.fmt))
+
+    def close(self):
+        if self.fmt != 'ndjson':
+            if not self.count:
+                self.f.write('[]')
+            else:
+                self.f.write('\n]' if self.fmt == 'pretty' else ']')
+        self.f.close()
+
+def read_entries(path):
+    """Read back a JSON or NDJSON output written by JsonArrayWriter"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.ndjson'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+# render_content's fields, which depend on nothing but post_content
+CONTENT_FIELDS = ('post_content', 'content_text', 'content_images', 'content_html')
+
+def content_hash(content):
+    """Key of a post body in a ContentStore"""
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+def content_store_file(fmt='pretty'):
+    return 'content-store.ndjson' if fmt == 'ndjson' else 'content-store.json'
+
+class ContentStore:
+    """
+    Streams a single copy of each distinct post body, with its
+    render_content fields, to an output of its own, keyed by content_hash.
+    Rows stored through it keep a content_hash where post_content was.
+    """
+
+    def __init__(self, path, fmt='pretty'):
+        self.writer = JsonArrayWriter(path, fmt)
+        self.seen = set()
+
+    def __contains__(self, digest):
+        return digest in self.seen
+
+    def reference(self, record, digest):
+        """
+        record with its body swapped for digest, storing the body first if
+        it is new; record must then hold every one of CONTENT_FIELDS
+        """
+        if digest not in self.seen:
+            self.seen.add(digest)
+            self.writer.write({'content_hash': digest, **{field: record[field] for field in CONTENT_FIELDS}})
+        ref = {}
+        for key, value in record.items():
+            if key == 'post_content':
+                ref['content_hash'] = digest
+            elif key not in CONTENT_FIELDS:
+                ref[key] = value
+        return ref
+
+    def close(self):
+        self.writer.close()
+
+def read_content_store(path):
+    """{content_hash: fields} from a store written by ContentStore"""
+    return {body.pop('content_hash'): body for body in read_entries(path)}
+
+def inline_content(ref, bodies):
+    """A row read back from a ContentStore reference, keys in their original order"""
+    body = bodies[ref['content_hash']]
+    record = {}
+    for key, value in ref.items():
+        if key == 'content_hash':
+            record['post_content'] = body['post_content']
+        else:
+            record[key] = value
+    for field in CONTENT_FIELDS[1:]:
+        record[field] = body[field]
+    return record
+
+def strip_rendered(record):
+    """record without the render_content fields, itself if it has none"""
+    if 'content_html' not in record:
+        return record
+    return {key: value for key, value in record.items() if key not in CONTENT_FIELDS[1:]}
+
+def write_outputs(entries, selections, names, output_dir, files, fmt, images=None, store=None,
+                  metrics=None, workers=1, texts=None, rendered=()):
+    """
+    Stream the selected rows of entries into each output in names.
+
+    Rows are visited once in dump order: each entry is encoded at most
+    twice, with and without the render_content fields, however many
+    outputs hold it, written straight to their files, then released, so
+    no output list or its JSON is ever held in memory. Only rows of the
+    outputs in rendered carry those fields; they are rendered as the row
+    is encoded unless a reused entry has them. Rendered content_images go
+    into the images dict by row if one is given, and content_text into
+    texts for the rows already keys of it.
+
+    With a ContentStore, all-posts rows reference their body by hash and
+    the store keeps it rendered; a body already stored is not rendered
+    again for a row that is in no rendered output.
+
+    Given a Metrics, the time spent decoding, rendering and encoding rows
+    is added to its write.decode, write.render and write.encode phases.
+
+    With workers > 1, post_content is decoded and rendered ahead of the
+    writes by render_parallel; time waiting on it counts as write.decode.
+    """
+    clock = time.perf_counter
+    spent = defaultdict(float)
+    row_outputs = defaultdict(list)
+    for name in names:
+        for row in selections[name]:
+            row_outputs[row].append(name)
+    rows = sorted(row_outputs)
+
+    def renders(row):
+        # Whether a Post row may need rendering; a stored body may spare it
+        return store is not None or any(name in rendered for name in row_outputs[row])
+
+    prerendered = None
+    if workers > 1:
+        bodies = (entries[row].raw('post_content') for row in rows
+                  if isinstance(entries[row], Post) and renders(row))
+        prerendered = render_parallel(bodies, workers)
+
+    writers = {name: JsonArrayWriter(os.path.join(output_dir, files[name]), fmt) for name in names}
+    try:
+        for row in rows:
+            entry = entries[row]
+            outputs = row_outputs[row]
+            full = [name for name in outputs if name in rendered]
+            plain = [name for name in outputs
+                     if name not in rendered and (store is None or name != 'all_posts')]
+            referenced = store is not None and 'all_posts' in outputs
+            record = entry
+            digest = fields = None
+            start = clock()
+            if isinstance(entry, Post):
+                if prerendered is not None and renders(row):
+                    entry['post_content'], fields = next(prerendered)
+                record = entry.to_dict()
+                spent['write.decode'] += clock() - start
+                start = clock()
+            if referenced:
+                digest = content_hash(record['post_content'])
+            if 'content_html' not in record and (full or referenced and digest not in store):
+                if fields is None:
+                    fields = render_content(record['post_content'])
+                if images is not None:
+                    images[row] = fields['content_images']
+                if texts is not None and row in texts:
+                    texts[row] = fields['content_text']
+                spent['write.render'] += clock() - start
+                start = clock()
+            else:
+                fields = None
+            if plain:
+                text = encode_element(strip_rendered(record), fmt)
+                for name in plain:
+                    writers[name].write_encoded(text)
+            if fields is not None:
+                record = {**record, **fields}
+            if full:
+                text = encode_element(record, fmt)
+                for name in full:
+                    writers[name].write_encoded(text)
+            if referenced:
+                writers['all_posts'].write(store.reference(record, digest))
+            spent['write.encode'] += clock() - start
+            if isinstance(entry, Post):
+                entry.release()
+    finally:
+        if prerendered is not None:
+            prerendered.close()
+        for writer in writers.values():
+            writer.close()
+        if store is not None:
+            store.close()
+        if metrics is not None:
+            for phase, seconds in spent.items():
+                metrics.phases[phase] += seconds
+            metrics.count('rows_written', len(row_outputs))
+
+def sink_record(post, fields=None, render=False):
+    """A post as the plain dict a sink writes, cut to fields if given"""
+    if fields is None:
+        record = post.to_dict() if isinstance(post, Post) else dict(post)
+    else:
+        record = {key: post[key] for key in fields if key in post}
+    if render:
+        record.update(render_content(record['post_content']))
+    return record
+
+def json_sink(labelled, output_dir, files, fmt='pretty', fields=None, render=False):
+    """
+    Sink stage: write (post, names) pairs into the JSON outputs in files, a
+    dict of output name to file name, each post going to the outputs it
+    is labelled with in the order it comes. fields limits records to those
+    keys ('meta' and any extras included), and render adds the
+    render_content fields. Returns how many records went to each output.
+    """
+    writers = {name: JsonArrayWriter(os.path.join(output_dir, filename), fmt)
+               for name, filename in files.items()}
+    try:
+        for post, names in labelled:
+            names = [name for name in names if name in writers]
+            if not names:
+                continue
+            record = sink_record(post, fields, render)
+            text = encode_element(record, fmt)
+            for name in names:
+                writers[name].write_encoded(text)
+            if isinstance(post, Post):
+                post.release()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {name: writer.count for name, writer in writers.items()}
+
+STATE_FILE = '.extract-state.json'
+
+def rules_digest(rules):
+    return hashlib.blake2b(json.dumps(rules, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+def rule_terms_digest(rules, taxonomy=None):
+    """
+    Hash of the term slugs each rule's "terms" resolve to, nested categories
+    included, so moving a category in the tree changes it even though no
+    post row does
+    """
+    resolved = {category: sorted(taxonomy.descendants(rule['terms']) if taxonomy else rule['terms'])
+                for category, rule in rules.items() if 'terms' in rule}
+    return hashlib.blake2b(json.dumps(resolved, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+def post_digest(post):
+    """Hash of a post's raw row, its metadata, and its categories and tags"""
+    h = hashlib.blake2b(post.row_digest(), digest_size=16)
+    if post.meta:
+        h.update(json.dumps(post.meta, ensure_ascii=False).encode('utf-8'))
+    terms = [post[key] for key in POST_TAXONOMIES.values() if post.get(key)]
+    if terms:
+        h.update(json.dumps(terms, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+def load_state(state_file, rules, output_dir, fmt, content_store=False, taxonomy=None):
+    """
+    Previous run's state, or None when it cannot be reused: missing,
+    written with other category rules, output format, content renderer or
+    content store setting, rule terms resolving to other categories in
+    taxonomy's tree, or its all-posts output (or content store) is gone.
+    """
+    all_posts = os.path.join(output_dir, output_files(rules, fmt)['all_posts'])
+    if not os.path.exists(state_file) or not os.path.exists(all_posts):
+        return None
+    if content_store and not os.path.exists(os.path.join(output_dir, content_store_file(fmt))):
+        return None
+    with open(state_file, encoding='utf-8') as f:
+        state = json.load(f)
+    if (state.get('rules') != rules_digest(rules) or state.get('format', 'pretty') != fmt
+            or state.get('content') != CONTENT_FIELDS_VERSION
+            or state.get('content_store', False) != content_store
+            or state.get('terms') != rule_terms_digest(rules, taxonomy)):
+        print("Category rules or tree, output format or content rendering changed since the last "
+              "run, extracting everything")
+        return None
+    return state
+
+def dedupe_rows(rows, ids):
+    """Rows in order, dropping any whose ID was already seen"""
+    seen = set()
+    result = []
+    for row in rows:
+        if ids[row] not in seen:
+            seen.add(ids[row])
+            result.append(row)
+    return result
+
+def plan_outputs(posts, rules, previous, output_dir, fmt, taxonomy=None, content_store=False):
+    """
+    Work out which rows go into every output, reusing what the previous
+    run produced.
+
+    A row counts as unchanged when its ID is unique in the dump and its
+    post_modified_gmt and digest (raw row bytes plus metadata) match the
+    previous state. Unchanged rows are neither decoded nor classified: their
+    entry comes back from the previous all-posts output, inlined again from
+    the previous content store if content_store or else taken from the page
+    or category output holding it, rendered fields and all, and their
+    outputs from the state. Returns (entries, selections, state, dirty): the entry
+    for each row, each output's rows in order, the state to save, and the
+    outputs whose content changed and so need rewriting.
+    """
+    ids = [post['ID'] for post in posts]
+    id_counts = defaultdict(int)
+    for post_id in ids:
+        id_counts[post_id] += 1
+    keys = [[post['post_modified_gmt'], post_digest(post)] for post in posts]
+
+    prev_posts = previous['posts'] if previous else {}
+    prev_outputs = previous['outputs'] if previous else {}
+    unchanged = [row for row, post_id in enumerate(ids)
+                 if id_counts[post_id] == 1 and prev_posts.get(post_id) == keys[row]]
+
+    entries = list(posts)
+    if unchanged:
+        print(f"Reusing {len(unchanged)} unchanged posts from the previous run")
+        files = output_files(rules, fmt)
+        all_posts = os.path.join(output_dir, files['all_posts'])
+        old_entries = {entry['ID']: entry for entry in read_entries(all_posts)}
+        if content_store:
+            bodies = read_content_store(os.path.join(output_dir, content_store_file(fmt)))
+        else:
+            # all-posts rows come without the render_content fields; pages
+            # and categorized posts get them back from their own outputs
+            for name in ['pages', *rules]:
+                path = os.path.join(output_dir, files[name])
+                if prev_outputs.get(name) and os.path.exists(path):
+                    for entry in read_entries(path):
+                        if entry['ID'] in old_entries:
+                            old_entries[entry['ID']] = entry
+        unchanged = [row for row in unchanged if ids[row] in old_entries]
+        for row in unchanged:
+            entry = old_entries[ids[row]]
+            entries[row] = inline_content(entry, bodies) if content_store else entry
+
+    reused = set(unchanged)
+    changed = [row for row in range(len(posts)) if row not in reused]
+    classified = classify_posts([posts[row] for row in changed], rules, taxonomy)
+    selections = {name: {changed[r] for r in rows} for name, rows in classified.items()}
+    for name, rows in selections.items():
+        members = set(prev_outputs.get(name, ()))
+        rows.update(row for row in unchanged if ids[row] in members)
+        selections[name] = dedupe_rows(sorted(rows), ids) if name in rules else sorted(rows)
+    selections['all_posts'] = range(len(posts))
+
+    # Deleted posts count as changed so outputs that held them are rewritten
+    changed_ids = {ids[row] for row in changed} | (prev_posts.keys() - set(ids))
+    state = {
+        'rules': rules_digest(rules),
+        'format': fmt,
+        'content': CONTENT_FIELDS_VERSION,
+        'content_store': content_store,
+        'terms': rule_terms_digest(rules, taxonomy),
+        'posts': {post_id: keys[row] for row, post_id in enumerate(ids)},
+        'outputs': {name: [ids[row] for row in rows] for name, rows in selections.items()},
+    }
+    dirty = {name for name, rows in selections.items()
+             if previous is None
+             or state['outputs'][name] != prev_outputs.get(name)
+             or any(ids[row] in changed_ids for row in rows)}
+    return entries, selections, state, dirty
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extracted-content')
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract WordPress content from a SQL dump')
+    parser.add_argument('sql_file', help='mysqldump file, plain or gzip/xz/bz2/zstd-compressed, '
+                                         'or a SQLite file made with --to-sqlite')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help='Where to write the JSON files (default: extracted-content)')
+    parser.add_argument('--to-sqlite', metavar='DB',
+                        help='Load the dump into an indexed SQLite file once and export from it; '
+                             'pass DB instead of the dump afterwards to skip parsing')
+    parser.add_argument('--meta-rules', default=DEFAULT_META_RULES,
+                        help='JSON allow/deny globs for meta keys (default: extract_meta.json)')
+    parser.add_argument('--all-meta', action='store_true',
+                        help='Keep every meta key, with values as raw strings')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse INSERT statements and render post content in N processes (default: 1)')
+    parser.add_argument('--categories', default=DEFAULT_CATEGORIES,
+                        help='JSON category rules (default: extract_categories.json)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only decode and classify posts changed since the last run')
+    parser.add_argument('--state', help=f'Incremental state file (default: <output dir>/{STATE_FILE})')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='pretty',
+                        help='pretty (indented JSON, default), compact JSON, or ndjson (one post per line)')
+    parser.add_argument('--revisions', choices=REVISION_MODES, default='all',
+                        help='Keep all revisions (default), only the latest of each post, or none')
+    parser.add_argument('--content-store', action='store_true',
+                        help='Write each distinct post body once to content-store.json and have '
+                             'all-posts reference it by hash')
+    parser.add_argument('--metrics', action='store_true',
+                        help=f'Write per-phase timings and per-table counts to {METRICS_FILE}')
+    parser.add_argument('--progress', action='store_true',
+                        help='Print rows/s, MB/s and an ETA to stderr while parsing')
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help='Profile the run with cProfile or tracemalloc; implies --metrics')
+    args = parser.parse_args()
+
+    metrics = None
+    if args.metrics or args.progress or args.profile:
+        metrics = Metrics(progress=args.progress, profile=args.profile)
+        metrics.start_profile()
+
+    taxonomy = Taxonomy()
+    meta_filter = None if args.all_meta else load_meta_rules(args.meta_rules)
+    with timed(metrics, 'load'):
+        if args.to_sqlite:
+            load_sqlite(args.sql_file, args.to_sqlite)
+            posts = read_store_posts(args.to_sqlite, taxonomy=taxonomy, meta_filter=meta_filter,
+                                     metrics=metrics)
+        elif is_sqlite_store(args.sql_file):
+            posts = read_store_posts(args.sql_file, taxonomy=taxonomy, meta_filter=meta_filter,
+                                     metrics=metrics)
+        else:
+            posts = process_sql_file(args.sql_file, workers=args.workers, taxonomy=taxonomy,
+                                     meta_filter=meta_filter, metrics=metrics)
+
+    if args.revisions != 'all':
+        count = len(posts)
+        with timed(metrics, 'revisions'):
+            posts = select_revisions(posts, args.revisions)
+        print(f"Dropped {count - len(posts)} revisions (--revisions {args.revisions})")
+
+    rules = load_category_rules(args.categories)
+
+    # Create output directory
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    state_file = args.state or os.path.join(output_dir, STATE_FILE)
+
+    previous = (load_state(state_file, rules, output_dir, args.format, args.content_store, taxonomy)
+                if args.incremental else None)
+    with timed(metrics, 'plan'):
+        entries, selections, state, dirty = plan_outputs(posts, rules, previous, output_dir,
+                                                         args.format, taxonomy, args.content_store)
+    pages = [entries[row] for row in selections['pages']]
+    categories = {category: [entries[row] for row in selections[category]] for category in rules}
+    menu_items = [entries[row] for row in selections['menu_items']]
+
+    print(f"\n=== EXTRACTION SUMMARY ===")
+    print(f"Pages: {len(pages)}")
+    for category, items in categories.items():
+        print(f"{category.replace('_', ' ').capitalize()}: {len(items)}")
+    print(f"Menu items: {len(menu_items)}")
+
+    # Save extracted content, leaving untouched outputs alone
+    print("\nSaving extracted content...")
+
+    files = output_files(rules, args.format)
+    for name, filename in files.items():
+        if name not in dirty:
+            print(f"  {filename} unchanged")
+    images = {}
+    # Pages and categorized posts: the ones the site renders and searches
+    shown = sorted({row for name in ['pages', *rules] for row in selections[name]})
+    texts = dict.fromkeys(shown)
+    store = None
+    if args.content_store and 'all_posts' in dirty:
+        store = ContentStore(os.path.join(output_dir, content_store_file(args.format)), args.format)
+    with timed(metrics, 'write'):
+        write_outputs(entries, selections, [name for name in files if name in dirty],
+                      output_dir, files, args.format, images, store, metrics, args.workers, texts,
+                      ['pages', *rules])
+    if store is not None:
+        print(f"  {content_store_file(args.format)}: {len(store.seen)} distinct bodies "
+              f"for {len(posts)} posts")
 
     # Create detailed summary
     summary = {
@@ -305,25 +3270,50 @@ def main():
             'count': len(pages),
             'list': [{'ID': p['ID'], 'title': p['post_title'], 'slug': p['post_name'], 'has_content': len(p['post_content']) > 100} for p in pages]
         },
-        'services': {
-            'count': len(services),
-            'list': [{'ID': p['ID'], 'title': p['post_title'], 'slug': p['post_name'], 'type': p['post_type']} for p in services]
-        },
-        'locations': {
-            'count': len(locations),
-            'list': [{'ID': p['ID'], 'title': p['post_title'], 'slug': p['post_name'], 'type': p['post_type']} for p in locations]
-        },
-        'providers': {
-            'count': len(providers),
-            'list': [{'ID': p['ID'], 'title': p['post_title'], 'slug': p['post_name'], 'type': p['post_type']} for p in providers]
-        },
-        'menu_items': {
-            'count': len(menu_items)
+    }
+    for category, items in categories.items():
+        summary[category] = {
+            'count': len(items),
+            'list': [{'ID': p['ID'], 'title': p['post_title'], 'slug': p['post_name'], 'type': p['post_type']} for p in items]
         }
+    summary['menu_items'] = {
+        'count': len(menu_items)
     }
 
-    with open(f"{output_dir}/extraction-summary.json", 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    if dirty:
+        with open(f"{output_dir}/extraction-summary.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        with timed(metrics, 'menus'):
+            index = PostIndex(posts)
+            menus = build_menus(posts, taxonomy, index)
+            with open(os.path.join(output_dir, MENU_TREE_FILE), 'w', encoding='utf-8') as f:
+                json.dump(menus, f, indent=2, ensure_ascii=False)
+        print(f"  {MENU_TREE_FILE}: {len(menus)} menus")
+
+        # Images on the pages and categorized posts the site renders
+        with timed(metrics, 'media'):
+            attachments = AttachmentIndex(index.rows(index.of_types('attachment')))
+            media = build_media_manifest(entries, shown, attachments, images)
+            with open(os.path.join(output_dir, MEDIA_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+                json.dump(media, f, indent=2, ensure_ascii=False)
+        resolved = sum(item['attachment_id'] is not None for item in media)
+        print(f"  {MEDIA_MANIFEST_FILE}: {len(media)} images, {resolved} in the media library "
+              f"({len(attachments)} attachments)")
+
+        with timed(metrics, 'search'):
+            search = build_search_index(entries, shown, texts)
+            shards = search.write(os.path.join(output_dir, SEARCH_INDEX_DIR))
+        print(f"  {SEARCH_INDEX_DIR}/: {len(search)} posts, {len(search.postings)} terms "
+              f"in {shards} shards")
+
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+    if metrics is not None:
+        metrics.stop_profile(output_dir)
+        report = metrics.write(os.path.join(output_dir, METRICS_FILE))
+        print(f"  {METRICS_FILE}: {report['elapsed']:.2f}s elapsed, {len(report['phases'])} phases")
 
     print(f"\n✓ Content saved to: {output_dir}")
 
@@ -333,20 +3323,11 @@ def main():
         print(f"{i}. {page['post_title']}")
         print(f"   Slug: {page['post_name']}, Content: {content_length} chars")
 
-    print("\n=== SERVICES ===")
-    for i, service in enumerate(services[:15], 1):
-        print(f"{i}. {service['post_title']}")
-        print(f"   Type: {service['post_type']}, Slug: {service['post_name']}")
-
-    print("\n=== LOCATIONS ===")
-    for i, location in enumerate(locations[:15], 1):
-        print(f"{i}. {location['post_title']}")
-        print(f"   Type: {location['post_type']}, Slug: {location['post_name']}")
-
-    print("\n=== PROVIDERS ===")
-    for i, provider in enumerate(providers[:15], 1):
-        print(f"{i}. {provider['post_title']}")
-        print(f"   Type: {provider['post_type']}, Slug: {provider['post_name']}")
+    for category, items in categories.items():
+        print(f"\n=== {category.replace('_', ' ').upper()} ===")
+        for i, item in enumerate(items[:15], 1):
+            print(f"{i}. {item['post_title']}")
+            print(f"   Type: {item['post_type']}, Slug: {item['post_name']}")
 
     print("\n✓ Extraction complete!")
 
@@ -3,196 +3,62 @@
 Extract content from WordPress SQL dump for Next.js migration
 """
 
-import re
 import json
-import html
+import argparse
+import os
 from collections import defaultdict
 
-def clean_text(text):
-    """Clean and decode HTML entities"""
-    if not text:
-        return ""
-    # Decode HTML entities
-    text = html.unescape(text)
-    return text
-
-def extract_posts(sql_content):
-    """Extract posts from wp_posts INSERT statements"""
-    posts = []
-
-    # Find INSERT INTO wp_posts statements
-    insert_pattern = r"INSERT INTO `wp_posts` VALUES \((.*?)\)(?:,\(|;)"
-
-    matches = re.finditer(insert_pattern, sql_content, re.DOTALL)
-
-    for match in matches:
-        values_str = match.group(1)
-        # Split by comma but respect quotes
-        values = parse_sql_values(values_str)
-
-        if len(values) >= 23:
-            post = {
-                'ID': values[0],
-                'post_author': values[1],
-                'post_date': values[2],
-                'post_content': clean_text(values[4]),
-                'post_title': clean_text(values[5]),
-                'post_excerpt': clean_text(values[6]),
-                'post_status': values[7],
-                'post_name': values[9],
-                'post_modified': values[11],
-                'post_parent': values[13],
-                'guid': values[14],
-                'menu_order': values[15],
-                'post_type': values[16],
-                'post_mime_type': values[17],
-            }
-            posts.append(post)
-
-    return posts
-
-def extract_postmeta(sql_content):
-    """Extract post metadata from wp_postmeta"""
-    postmeta = defaultdict(dict)
-
-    # Find INSERT INTO wp_postmeta statements
-    insert_pattern = r"INSERT INTO `wp_postmeta` VALUES \((.*?)\)(?:,\(|;)"
-
-    matches = re.finditer(insert_pattern, sql_content, re.DOTALL)
-
-    for match in matches:
-        values_str = match.group(1)
-        values = parse_sql_values(values_str)
-
-        if len(values) >= 4:
-            post_id = values[1]
-            meta_key = values[2]
-            meta_value = clean_text(values[3])
-
-            postmeta[post_id][meta_key] = meta_value
-
-    return postmeta
-
-def parse_sql_values(values_str):
-    """Parse SQL INSERT values, handling quoted strings properly"""
-    values = []
-    current_value = ""
-    in_quotes = False
-    quote_char = None
-    escape_next = False
-
-    i = 0
-    while i < len(values_str):
-        char = values_str[i]
-
-        if escape_next:
-            current_value += char
-            escape_next = False
-            i += 1
-            continue
-
-        if char == '\\':
-            escape_next = True
-            current_value += char
-            i += 1
-            continue
-
-        if char in ('"', "'") and not in_quotes:
-            in_quotes = True
-            quote_char = char
-            i += 1
-            continue
-
-        if char == quote_char and in_quotes:
-            in_quotes = False
-            quote_char = None
-            i += 1
-            continue
-
-        if char == ',' and not in_quotes:
-            values.append(current_value.strip())
-            current_value = ""
-            i += 1
-            continue
-
-        current_value += char
-        i += 1
-
-    if current_value:
-        values.append(current_value.strip())
-
-    return values
-
-def extract_terms(sql_content):
-    """Extract taxonomy terms"""
-    terms = []
-
-    # Find INSERT INTO wp_terms
-    insert_pattern = r"INSERT INTO `wp_terms` VALUES \((.*?)\)(?:,\(|;)"
-
-    matches = re.finditer(insert_pattern, sql_content, re.DOTALL)
-
-    for match in matches:
-        values_str = match.group(1)
-        values = parse_sql_values(values_str)
-
-        if len(values) >= 4:
-            term = {
-                'term_id': values[0],
-                'name': clean_text(values[1]),
-                'slug': values[2],
-                'term_group': values[3]
-            }
-            terms.append(term)
-
-    return terms
-
-def extract_menus(sql_content):
-    """Extract menu structure"""
-    menus = []
-
-    # Get nav_menu_item posts
-    posts_pattern = r"INSERT INTO `wp_posts`.*?post_type.*?nav_menu_item"
-
-    return menus
+from extract_final import (
+    DEFAULT_OUTPUT_DIR, MENU_TREE_FILE, POST_TABLES, TAXONOMY_TABLES, Taxonomy, build_menus, decode_rows,
+    iter_dump_tuples, join_posts, json_sink, label_posts, output_files,
+)
+
+# Keys kept in each post record
+POST_FIELDS = (
+    'ID', 'post_author', 'post_date', 'post_content', 'post_title',
+    'post_excerpt', 'post_status', 'post_name', 'post_modified',
+    'post_parent', 'guid', 'menu_order', 'post_type', 'post_mime_type',
+    'meta', 'categories', 'tags',
+)
+# Categories beyond pages and menu items, in the rule format of
+# extract_categories.json but defined here
+RULES = {
+    'services': {'post_types': ['service', 'services'], 'keywords': ['service', 'treatment', 'procedure']},
+    'locations': {'post_types': ['location', 'locations'], 'keywords': ['location', 'office', 'clinic']},
+}
+
+def extract_content(sql_file):
+    """
+    Stream posts, post metadata and the three taxonomy tables out of the
+    SQL dump, returning (posts, taxonomy) with each post's meta, categories
+    and tags attached
+    """
+    taxonomy = Taxonomy()
+    columns = {}
+    tuples = iter_dump_tuples(sql_file, POST_TABLES + TAXONOMY_TABLES, columns)
+    posts = list(join_posts(decode_rows(tuples, columns), taxonomy))
+    return posts, taxonomy
 
 def main():
-    print("Reading SQL file...")
-    sql_file = "/Users/alvarogonzalez/Desktop/SSD Website Complete 10-12-25/Old SSD Website/wp-content/mysql.sql"
-
-    with open(sql_file, 'r', encoding='utf-8', errors='ignore') as f:
-        sql_content = f.read()
-
-    print("Extracting posts...")
-    posts = extract_posts(sql_content)
-
-    print("Extracting post metadata...")
-    postmeta = extract_postmeta(sql_content)
-
-    print("Extracting taxonomy terms...")
-    terms = extract_terms(sql_content)
-
-    # Combine posts with their metadata
-    for post in posts:
-        post_id = post['ID']
-        if post_id in postmeta:
-            post['meta'] = postmeta[post_id]
-
-    # Filter by post type
-    pages = [p for p in posts if p['post_type'] == "'page'" and p['post_status'] == "'publish'"]
-    services = [p for p in posts if p['post_type'] in ("'service'", "'services'") and p['post_status'] == "'publish'"]
-    locations = [p for p in posts if p['post_type'] in ("'location'", "'locations'") and p['post_status'] == "'publish'"]
-    menu_items = [p for p in posts if p['post_type'] == "'nav_menu_item'"]
-
-    # Also check for services/locations in pages or custom fields
-    for page in pages:
-        title_lower = page['post_title'].lower()
-        name_lower = page['post_name'].lower()
-
-        if any(keyword in title_lower or keyword in name_lower for keyword in ['service', 'treatment', 'procedure']):
-            services.append(page)
-        elif any(keyword in title_lower or keyword in name_lower for keyword in ['location', 'office', 'clinic']):
-            locations.append(page)
+    parser = argparse.ArgumentParser(description='Extract WordPress content from a SQL dump for the Next.js migration')
+    parser.add_argument('sql_file', help='mysqldump file, plain or gzip/xz/bz2/zstd-compressed')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help='Where to write the JSON files (default: extracted-content)')
+    args = parser.parse_args()
+    sql_file = args.sql_file
+
+    print("Extracting posts, post metadata and taxonomy terms...")
+    posts, taxonomy = extract_content(sql_file)
+    terms = taxonomy.term_list()
+
+    # Sort posts into pages, services, locations and menu items
+    labelled = list(label_posts(posts, RULES, taxonomy))
+    outputs = defaultdict(list)
+    for post, names in labelled:
+        for name in names:
+            outputs[name].append(post)
+    pages, services, locations, menu_items = (
+        outputs[name] for name in ('pages', 'services', 'locations', 'menu_items'))
 
     print(f"\nFound:")
     print(f"  - {len(pages)} pages")
@@ -201,29 +67,25 @@ def main():
     print(f"  - {len(menu_items)} menu items")
     print(f"  - {len(terms)} taxonomy terms")
 
+    menus = build_menus(posts, taxonomy)
+
     # Create output directory
-    import os
-    output_dir = "/Users/alvarogonzalez/Desktop/SSD Website Complete 10-12-25/ssd-nextjs/extracted-content"
+    output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
 
     # Save extracted content
     print("\nSaving extracted content...")
 
-    with open(f"{output_dir}/services-complete.json", 'w', encoding='utf-8') as f:
-        json.dump(services, f, indent=2, ensure_ascii=False)
-
-    with open(f"{output_dir}/locations-complete.json", 'w', encoding='utf-8') as f:
-        json.dump(locations, f, indent=2, ensure_ascii=False)
-
-    with open(f"{output_dir}/pages-content.json", 'w', encoding='utf-8') as f:
-        json.dump(pages, f, indent=2, ensure_ascii=False)
-
-    with open(f"{output_dir}/menu-structure.json", 'w', encoding='utf-8') as f:
-        json.dump(menu_items, f, indent=2, ensure_ascii=False)
+    files = output_files(RULES)
+    del files['all_posts']
+    json_sink(labelled, output_dir, files, fields=POST_FIELDS)
 
     with open(f"{output_dir}/taxonomy-terms.json", 'w', encoding='utf-8') as f:
         json.dump(terms, f, indent=2, ensure_ascii=False)
 
+    with open(f"{output_dir}/{MENU_TREE_FILE}", 'w', encoding='utf-8') as f:
+        json.dump(menus, f, indent=2, ensure_ascii=False)
+
     # Create a summary
     summary = {
         'extraction_date': '2025-10-12',
@@ -6,26 +6,34 @@ const providers = require('./providers-complete.json');
 const services = require('./services-complete.json');
 const locations = require('./locations-complete.json');
 
-// Helper function to extract image URL from Divi shortcode content
-function extractImageUrl(content) {
+// Filter out dividers, icons, and other non-main images
+function isMainImage(url) {
+  return !url.includes('Divider') &&
+         !url.includes('divider') &&
+         !url.includes('icon') &&
+         !url.includes('Icon') &&
+         !url.includes('youtube') &&
+         !url.includes('youtu.be') &&
+         !url.includes('Logo_As_BG') &&
+         !url.includes('.svg') &&
+         (url.includes('.jpg') || url.includes('.jpeg') || url.includes('.png') || url.includes('.webp'));
+}
+
+// Helper function to extract a post's image URL, from the content_images
+// extract_final.py precomputes or else from its Divi shortcode content
+function extractImageUrl(post) {
+  if (Array.isArray(post.content_images)) {
+    return post.content_images.find(isMainImage) || null;
+  }
+  const content = post.post_content;
+
   // Find all src URLs
   const srcMatches = content.match(/src="([^"]+)"/g);
 
   if (srcMatches) {
-    // Filter out dividers, icons, and other non-main images
     const cleanUrls = srcMatches
       .map(m => m.match(/src="([^"]+)"/)[1])
-      .filter(url => {
-        return !url.includes('Divider') &&
-               !url.includes('divider') &&
-               !url.includes('icon') &&
-               !url.includes('Icon') &&
-               !url.includes('youtube') &&
-               !url.includes('youtu.be') &&
-               !url.includes('Logo_As_BG') &&
-               !url.includes('.svg') &&
-               (url.includes('.jpg') || url.includes('.jpeg') || url.includes('.png') || url.includes('.webp'));
-      });
+      .filter(isMainImage);
 
     if (cleanUrls.length > 0) return cleanUrls[0];
   }
@@ -41,10 +49,13 @@ function extractImageUrl(content) {
   return null;
 }
 
-// Helper function to extract text content from HTML/shortcodes
-function extractTextContent(content) {
+// Helper function to extract a post's text content, from the content_text
+// extract_final.py precomputes or else from its HTML/shortcodes
+function extractTextContent(post) {
+  if (typeof post.content_text === 'string') return post.content_text;
+
   // Remove Divi shortcodes
-  let text = content.replace(/\[et_pb[^\]]*\]/g, '');
+  let text = post.post_content.replace(/\[et_pb[^\]]*\]/g, '');
   text = text.replace(/\[\/et_pb[^\]]*\]/g, '');
   text = text.replace(/\[dsm[^\]]*\]/g, '');
   text = text.replace(/\[\/dsm[^\]]*\]/g, '');
@@ -84,8 +95,8 @@ const parsedProviders = providers
            !p.post_title.includes('Template');
   })
   .map(provider => {
-    const imageUrl = extractImageUrl(provider.post_content);
-    const textContent = extractTextContent(provider.post_content);
+    const imageUrl = extractImageUrl(provider);
+    const textContent = extractTextContent(provider);
 
     // Try to extract a short bio (first paragraph)
     const shortBio = truncateText(textContent, 250);
@@ -149,8 +160,8 @@ const parsedServices = services
            !s.post_title.includes('Template');
   })
   .map(service => {
-    const imageUrl = extractImageUrl(service.post_content);
-    const textContent = extractTextContent(service.post_content);
+    const imageUrl = extractImageUrl(service);
+    const textContent = extractTextContent(service);
     const shortDescription = truncateText(textContent, 150);
 
     // Determine category
@@ -196,8 +207,8 @@ const parsedLocations = locations
            !l.post_title.includes('Template');
   })
   .map(location => {
-    const imageUrl = extractImageUrl(location.post_content);
-    const textContent = extractTextContent(location.post_content);
+    const imageUrl = extractImageUrl(location);
+    const textContent = extractTextContent(location);
 
     // Extract address, phone, etc. from content
     // This is a simplified extraction - you might need to adjust based on actual content structure
@@ -0,0 +1,406 @@
+"""Tests for extract_final.py"""
+
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import extract_final as ef
+
+
+class CleanTextTest(unittest.TestCase):
+
+    # (raw field, expected clean_text result)
+    CASES = [
+        ("NULL", ""),
+        ("''", ""),
+        ("'plain'", "plain"),
+        ('"double"', "double"),
+        ("'it\\'s'", "it's"),
+        ("'say \\\"hi\\\"'", 'say "hi"'),
+        ("'a\\nb'", "a\nb"),
+        ("'a\\r\\nb'", "a\nb"),
+        ("'a\\rb'", "a\nb"),
+        ("'a\\tb'", "a\tb"),
+        ("'a\\0b'", "a\0b"),
+        ("'a\\bb'", "a\bb"),
+        ("'a\\Zb'", "a\x1ab"),
+        ("'C:\\\\new'", "C:\\new"),
+        ("'\\\\n'", "\\n"),
+        ("'\\\\\\n'", "\\\n"),
+        ("'100\\%'", "100\\%"),
+        ("'a\\_b'", "a\\_b"),
+        ("'\\q'", "q"),
+        ("'trailing\\'", "trailing\\"),
+        ("'Q&amp;A &lt;b&gt;'", "Q&A <b>"),
+        ("'&amp;amp;'", "&amp;"),
+        ("'\\&amp;'", "&"),
+        ("'no entities & no escapes'", "no entities & no escapes"),
+    ]
+
+    def test_cases(self):
+        for raw, expected in self.CASES:
+            with self.subTest(raw=raw):
+                self.assertEqual(ef.clean_text(raw), expected)
+
+
+class PhpUnserializeTest(unittest.TestCase):
+
+    def test_scalars_and_arrays(self):
+        self.assertEqual(ef.php_unserialize('i:42;'), 42)
+        self.assertEqual(ef.php_unserialize('b:1;'), True)
+        self.assertIsNone(ef.php_unserialize('N;'))
+        self.assertEqual(ef.php_unserialize('a:2:{i:0;s:1:"a";i:1;s:1:"b";}'), ['a', 'b'])
+        self.assertEqual(ef.php_unserialize('a:1:{s:3:"alt";s:0:"";}'), {'alt': ''})
+
+    def test_string_lengths_count_bytes(self):
+        self.assertEqual(ef.php_unserialize('s:2:"é";'), 'é')
+        with self.assertRaises(ValueError):
+            ef.php_unserialize('s:1:"é";')
+
+    def test_malformed(self):
+        for data in (
+            's:2:"bad";',                  # length too short
+            's:9:"bad";',                  # length past the end
+            's:x:"bad";',
+            's:3:"abc"',                   # missing terminator
+            'a:2:{i:0;s:1:"a";}',          # fewer items than counted
+            'a:1:{i:0;s:1:"a";i:1;s:1:"b";}',
+            'a:1:{a:0:{}s:1:"a";}',        # array as a key
+            'b:2;',
+            'O:8:"stdClass":0:{}',
+            'i:1;i:2;',
+            'a:1:{i:0;' * 2000,
+        ):
+            with self.subTest(data=data[:40]):
+                with self.assertRaises(ValueError):
+                    ef.php_unserialize(data)
+
+    def test_maybe_unserialize_leaves_malformed_values(self):
+        self.assertEqual(ef.maybe_unserialize('s:2:"bad";'), 's:2:"bad";')
+        self.assertEqual(ef.maybe_unserialize('plain text'), 'plain text')
+
+
+class SanitizeHtmlTest(unittest.TestCase):
+
+    def test_unsafe_urls_removed(self):
+        for href in ('javascript:alert(1)', ' JavaScript:alert(1)', 'javascript&#58;alert(1)',
+                     '&#106;avascript:alert(1)', 'jav&#x09;ascript:alert(1)',
+                     'data:text/html;base64,PHNjcmlwdD4=', 'vbscript:msgbox(1)'):
+            with self.subTest(href=href):
+                self.assertEqual(ef.sanitize_html(f'<a href="{href}">x</a>'), '<a>x</a>')
+
+    def test_safe_urls_kept(self):
+        for href in ('https://example.com/a?b=1', '/about/', 'page#top', 'mailto:a@example.com'):
+            with self.subTest(href=href):
+                self.assertEqual(ef.sanitize_html(f'<a href="{href}">x</a>'),
+                                 f'<a href="{href}">x</a>')
+
+    def test_event_handlers_removed(self):
+        self.assertEqual(ef.sanitize_html('<img src="/a.png" onerror="alert(1)">'),
+                         '<img src="/a.png">')
+        self.assertEqual(ef.sanitize_html('<p onclick=alert(1) ONMOUSEOVER="x">hi</p>'),
+                         '<p>hi</p>')
+
+    def test_script_like_elements_dropped_whole(self):
+        self.assertEqual(ef.sanitize_html('a<script>alert("<p>")</script>b'), 'ab')
+        self.assertEqual(ef.sanitize_html('a<SVG onload=alert(1)><script>x</script></svg>b'), 'ab')
+        self.assertEqual(ef.sanitize_html('a<iframe src="https://evil.test">x</iframe>b'), 'ab')
+        self.assertEqual(ef.sanitize_html('<div><style>p{}</style><p>b</p></div>'), '<p>b</p>')
+
+    def test_unclosed_elements(self):
+        # An unclosed dropped element loses its tag only
+        self.assertEqual(ef.sanitize_html('<p>a<iframe src="x">b</p><p>c</p>'),
+                         '<p>ab</p><p>c</p>')
+        self.assertEqual(ef.sanitize_html('<form action="/x"><p>kept</p>'), '<p>kept</p>')
+        self.assertEqual(ef.sanitize_html('<ul><li><b>a'), '<ul><li><b>a</b></li></ul>')
+        self.assertEqual(ef.sanitize_html('<p>a</b></p>'), '<p>a</p>')
+        self.assertEqual(ef.sanitize_html('a <img src="x" onerror="alert(1)"'),
+                         'a &lt;img src="x" onerror="alert(1)"')
+
+    def test_text_and_attributes_escaped(self):
+        self.assertEqual(ef.sanitize_html('<a title=\'"><script>\'>1 < 2</a>'),
+                         '<a title="&quot;&gt;&lt;script&gt;">1 &lt; 2</a>')
+
+
+class InsertTuplesTest(unittest.TestCase):
+
+    CREATE = ("CREATE TABLE `wp_terms` (\n  `term_id` bigint(20) unsigned NOT NULL,\n"
+              "  `name` varchar(200) NOT NULL DEFAULT '',\n  `slug` varchar(200) NOT NULL DEFAULT '',\n"
+              "  PRIMARY KEY (`term_id`)\n) ENGINE=InnoDB;\n")
+    ROWS = [
+        "(1,'Plain','plain')",
+        "(2,'It\\'s; (odd)','a\\\\b')",
+        "(3,'Line\\nbreak\\r\\n','\\'),(\\'')",
+        "(4,NULL,\"dq 'x'\")",
+        "(5,'',  'spaced' )",
+    ]
+    DUMPS = {
+        'extended': CREATE + f"INSERT INTO `wp_terms` VALUES {','.join(ROWS)};\n"
+                    "INSERT INTO `wp_options` VALUES (1,'skipped');\n",
+        'crlf': (CREATE + f"INSERT INTO `wp_terms` VALUES {','.join(ROWS)};\n").replace('\n', '\r\n'),
+        'multi-line': CREATE + "INSERT INTO `wp_terms` VALUES\n" + ',\n'.join(ROWS) + ";\n",
+        'skip-extended-insert': CREATE + ''.join(
+            f"INSERT INTO `wp_terms` (`term_id`, `name`, `slug`) VALUES {row};\n" for row in ROWS),
+    }
+
+    @staticmethod
+    def fields(tuples, columns):
+        return [(table, columns.get(table), [bytes(data[a:b - 1]) for a, b in zip(bounds, bounds[1:])])
+                for table, data, bounds in tuples]
+
+    def test_chunked_matches_buffer(self):
+        for name, dump in self.DUMPS.items():
+            dump = dump.encode('utf-8')
+            columns = {}
+            expected = self.fields(ef.iter_buffer_tuples(dump, ['wp_terms'], columns=columns), columns)
+            self.assertEqual(len(expected), len(self.ROWS))
+            self.assertEqual(expected[0][1], ('term_id', 'name', 'slug'))
+            self.assertEqual(expected[2][2][2], b"'\\'),(\\''")
+            for chunk_size in (1, 7, 4096):
+                with self.subTest(dump=name, chunk_size=chunk_size):
+                    columns = {}
+                    tuples = ef.iter_insert_tuples(io.BytesIO(dump), ['wp_terms'], chunk_size, columns)
+                    self.assertEqual(self.fields(tuples, columns), expected)
+
+
+class DecodeMetaValueTest(unittest.TestCase):
+
+    def test_entities_decoded_after_unserializing(self):
+        # s:N: counts the bytes of the entity as stored, not of the decoded text
+        value = 'Q&amp;A é'
+        length = len(value.encode('utf-8'))
+        self.assertEqual(ef.decode_meta_value(f's:{length}:"{value}";'), 'Q&A é')
+        self.assertEqual(
+            ef.decode_meta_value(f'a:1:{{s:7:"caption";s:{length}:"{value}";}}'),
+            {'caption': 'Q&A é'})
+
+    def test_plain_values(self):
+        self.assertEqual(ef.decode_meta_value('Tom &amp; Jerry'), 'Tom & Jerry')
+        self.assertEqual(ef.decode_meta_value('s:2:"bad";'), 's:2:"bad";')
+
+
+def make_post(post_id, **fields):
+    """A decoded wp_posts row with the fields these tests don't care about filled in"""
+    post = {'ID': str(post_id), 'post_type': 'page', 'post_status': 'publish', 'post_parent': '0',
+            'post_name': f'post-{post_id}', 'post_title': f'Post {post_id}', 'post_excerpt': '',
+            'post_content': '', 'menu_order': '0', 'guid': ''}
+    post.update(fields)
+    return post
+
+
+class PostIndexTest(unittest.TestCase):
+
+    def test_lookups(self):
+        posts = [make_post(1), make_post(2, post_type='attachment'), make_post(1, post_name='again')]
+        index = ef.PostIndex(posts)
+        self.assertEqual(index.get('1')['post_name'], 'again')
+        self.assertIsNone(index.get('3'))
+        self.assertEqual(index.rows(index.of_types('page', 'attachment')), posts)
+
+    def test_post_path_follows_parents(self):
+        posts = [make_post(1, post_name='services'),
+                 make_post(2, post_name='skin', post_parent='1'),
+                 make_post(3, post_name='acne', post_parent='2'),
+                 make_post(4, post_name='loop', post_parent='5'),
+                 make_post(5, post_name='back', post_parent='4')]
+        index = ef.PostIndex(posts)
+        self.assertEqual(ef.post_path(posts[2], index), '/services/skin/acne')
+        self.assertEqual(ef.post_path(posts[3], index), '/back/loop')
+
+
+class AttachmentIndexTest(unittest.TestCase):
+
+    CAPTION = 'Q&amp;A é'
+    METADATA = ('a:3:{s:5:"width";i:800;s:5:"sizes";a:1:{s:9:"thumbnail";a:2:{s:4:"file";'
+                's:9:"a-150.jpg";s:5:"width";i:150;}}s:10:"image_meta";a:1:{s:7:"caption";'
+                f's:{len(CAPTION.encode("utf-8"))}:"{CAPTION}";}}}}')
+    DUMP = ("INSERT INTO `wp_posts` (`ID`, `guid`, `post_type`, `post_mime_type`) VALUES "
+            "(7,'https://example.com/wp-content/uploads/2020/01/a.jpg','attachment','image/jpeg');\n"
+            "INSERT INTO `wp_postmeta` VALUES (1,7,'_wp_attached_file','2020/01/a.jpg'),"
+            f"(2,7,'_wp_attachment_metadata','{METADATA}');\n").encode('utf-8')
+
+    def assertIndexed(self, posts):
+        index = ef.AttachmentIndex(posts)
+        thumbnail = index.resolve('https://example.com/wp-content/uploads/2020/01/a-150.jpg')
+        self.assertEqual((thumbnail['size'], thumbnail['width']), ('thumbnail', 150))
+        self.assertEqual(index.resolve('/wp-content/uploads/2020/01/a.jpg')['width'], 800)
+
+    def test_metadata_with_entities(self):
+        for meta_filter in (None, ef.MetaFilter()):
+            with self.subTest(meta_filter=meta_filter):
+                columns = {}
+                tuples = ef.iter_buffer_tuples(self.DUMP, ef.POST_TABLES, columns=columns)
+                posts, postmeta = ef.collect_posts(tuples, columns, meta_filter=meta_filter)
+                ef.attach_meta(posts, postmeta)
+                self.assertIndexed(posts)
+
+    def test_metadata_from_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sql_file = f'{directory}/dump.sql'
+            with open(sql_file, 'wb') as f:
+                f.write(self.DUMP)
+            ef.load_sqlite(sql_file, f'{directory}/dump.db')
+            with mock.patch('builtins.print'):
+                posts = ef.read_store_posts(f'{directory}/dump.db')
+        self.assertIndexed(posts)
+
+
+class MetricsTest(unittest.TestCase):
+
+    DUMP = (b"INSERT INTO `wp_postmeta` VALUES (1,10,'_edit_lock','1'),(2,10,'keep','a'),"
+            b"(3,11,'_edit_lock','2');\n")
+
+    def test_rows_and_bytes_counted_before_filtering(self):
+        metrics = ef.Metrics()
+        tuples = ef.iter_buffer_tuples(self.DUMP, ef.POST_TABLES)
+        _, postmeta = ef.collect_posts(tuples, meta_filter=ef.MetaFilter(deny=['_edit_lock']),
+                                       metrics=metrics)
+        self.assertEqual(dict(postmeta), {'10': {'keep': 'a'}})
+        stats = metrics.tables['wp_postmeta']
+        self.assertEqual(stats['rows'], 3)
+        self.assertGreater(stats['bytes'], 0)
+        self.assertTrue({'scan.tokenize', 'scan.decode', 'scan.gather'} <= metrics.phases.keys())
+
+    def test_stage_times_exclude_inner_stage(self):
+        metrics = ef.Metrics()
+        clock = iter(range(100))
+        with mock.patch.object(ef.time, 'perf_counter', lambda: next(clock)):
+            inner = metrics.stage([1, 2], 'inner')
+            outer = metrics.stage(inner, 'outer', 'inner')
+            self.assertEqual(list(outer), [1, 2])
+        # Every clock read advances one second: three next() calls on each stage
+        self.assertEqual(metrics.phases['inner'], 3)
+        self.assertEqual(metrics.phases['outer'], 6)
+
+
+def sql_value(value):
+    if isinstance(value, int):
+        return str(value)
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'").replace('\n', '\\n') + "'"
+
+
+def sample_dump(titles):
+    """
+    A dump of pages, services and revisions titled titles, a nav menu and an
+    attachment, one row per INSERT as --skip-extended-insert writes them
+    """
+    rows = []
+    for n, title in enumerate(titles, 1):
+        post_type = 'revision' if n % 5 == 0 else 'service' if n % 3 == 0 else 'page'
+        rows.append(('wp_posts', make_post(
+            n, post_type=post_type, post_status='inherit' if post_type == 'revision' else 'publish',
+            post_title=title, post_name=title.lower().replace(' ', '-'),
+            post_parent=str(n - 1 if post_type == 'revision' else 0),
+            post_content=f'<p>{title} &amp; more</p>\n<img src="/wp-content/uploads/a.jpg">')))
+        rows.append(('wp_postmeta', (n, n, '_thumbnail_id', '100')))
+    rows.append(('wp_posts', make_post(100, post_type='attachment', post_status='inherit',
+                                       guid='https://example.com/wp-content/uploads/a.jpg')))
+    rows.append(('wp_posts', make_post(101, post_type='nav_menu_item', menu_order='1')))
+    rows.append(('wp_postmeta', (200, 101, '_menu_item_object_id', '1')))
+    rows.append(('wp_postmeta', (201, 101, '_menu_item_type', 'post_type')))
+    rows.append(('wp_terms', (1, 'Treatments', 'treatments', 0)))
+    rows.append(('wp_terms', (2, 'Main', 'main', 0)))
+    rows.append(('wp_term_taxonomy', (1, 1, 'category', '', 0, 1)))
+    rows.append(('wp_term_taxonomy', (2, 2, 'nav_menu', '', 0, 1)))
+    rows.append(('wp_term_relationships', (2, 1, 0)))
+    rows.append(('wp_term_relationships', (101, 2, 0)))
+
+    lines = []
+    for table, row in rows:
+        if table == 'wp_posts':
+            row = [row.get(name, '') for name in ef.POST_COLUMNS]
+        lines.append(f"INSERT INTO `{table}` VALUES ({','.join(map(sql_value, row))});\n")
+    return ''.join(lines).encode('utf-8')
+
+
+class ExtractRunTest(unittest.TestCase):
+
+    TITLES = [f'{topic} {n}' for n in range(4) for topic in ('Acne Treatment', 'About Us', 'Mohs Surgery')]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_dump(self, name, titles):
+        sql_file = f'{self.directory}/{name}'
+        with open(sql_file, 'wb') as f:
+            f.write(sample_dump(titles))
+        return sql_file
+
+    def run_main(self, sql_file, output, *args):
+        output_dir = f'{self.directory}/{output}'
+        argv = ['extract_final.py', sql_file, '--output-dir', output_dir, *args]
+        with mock.patch.object(ef.sys, 'argv', argv), mock.patch('builtins.print'):
+            ef.main()
+        return output_dir
+
+    @staticmethod
+    def output_files(output_dir, ignore):
+        return sorted(os.path.relpath(os.path.join(root, name), output_dir)
+                      for root, _, names in os.walk(output_dir) for name in names if name not in ignore)
+
+    def assertSameOutput(self, first, second, ignore=()):
+        names = self.output_files(first, ignore)
+        self.assertEqual(names, self.output_files(second, ignore))
+        for name in names:
+            with self.subTest(file=name), open(f'{first}/{name}', 'rb') as a, \
+                    open(f'{second}/{name}', 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+
+    def test_workers_match_serial(self):
+        sql_file = self.write_dump('dump.sql', self.TITLES)
+        for args in ((), ('--revisions', 'none'), ('--all-meta', '--content-store')):
+            with self.subTest(args=args):
+                serial = self.run_main(sql_file, f'serial{len(args)}', *args)
+                parallel = self.run_main(sql_file, f'parallel{len(args)}', '--workers', '2', *args)
+                self.assertSameOutput(serial, parallel)
+
+    def test_incremental_after_edit_matches_full_run(self):
+        # A page that now also belongs in services
+        edited = [title.replace('About Us 2', 'Laser Peel 2') for title in self.TITLES]
+        for args in ((), ('--content-store',), ('--format', 'ndjson')):
+            with self.subTest(args=args):
+                output = f'incremental{len(args)}'
+                self.run_main(self.write_dump('dump.sql', self.TITLES), output, '--incremental', *args)
+                incremental = self.run_main(self.write_dump('dump.sql', edited), output,
+                                            '--incremental', *args)
+                full = self.run_main(self.write_dump('edited.sql', edited), f'full{len(args)}', *args)
+                self.assertSameOutput(incremental, full, ignore=[ef.STATE_FILE])
+
+
+class SearchPrefixTest(unittest.TestCase):
+
+    def setUp(self):
+        index = ef.SearchIndex()
+        for n, (title, text) in enumerate((
+            ('Acne Treatment', 'Treatments for acne'),
+            ('Mohs Surgery', 'Skin cancer surgery'),
+            ('Case Studies', 'Patient studies'),
+        )):
+            index.add(make_post(n + 1, post_title=title), text)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        index.write(self.directory.name)
+        self.reader = ef.SearchReader(self.directory.name)
+
+    def ids(self, query, prefix=True):
+        return [int(doc['ID']) for doc in self.reader.search(query, prefix=prefix)]
+
+    def test_unfinished_word_matches_shorter_stem(self):
+        for query in ('trea', 'treatm', 'treatme', 'treatmen', 'treatment', 'treatments'):
+            with self.subTest(query=query):
+                self.assertEqual(self.ids(query), [1])
+        self.assertEqual(self.ids('studi'), [3])
+
+    def test_only_last_word_is_a_prefix(self):
+        self.assertEqual(self.ids('skin surg'), [2])
+        self.assertEqual(self.ids('surg'), [2])
+        self.assertEqual(self.ids('surg', prefix=False), [])
+        self.assertEqual(self.ids('treatm', prefix=False), [])
+
+
+if __name__ == '__main__':
+    unittest.main()